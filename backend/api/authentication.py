@@ -0,0 +1,67 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from api.cache import is_process_local
+
+TOKEN_CACHE_KEY = 'auth-token:{}'
+USER_CACHE_KEY = 'auth-user:{}'
+
+
+def token_cache_key(key):
+    # В ключ кэша попадает хэш, чтобы сами токены не лежали в кэше.
+    return TOKEN_CACHE_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def token_cache_timeout():
+    # Кэш в памяти процесса не узнает о выходе или смене пароля в другом
+    # процессе gunicorn, поэтому с ним отозванный токен может работать там
+    # не дольше короткого TOKEN_CACHE_LOCAL_TIMEOUT.
+    if is_process_local():
+        return min(settings.TOKEN_CACHE_TIMEOUT,
+                   settings.TOKEN_CACHE_LOCAL_TIMEOUT)
+    return settings.TOKEN_CACHE_TIMEOUT
+
+
+def forget_token(key):
+    """Убирает пользователя токена из кэша."""
+    cache.delete(token_cache_key(key))
+
+
+def forget_user(user_id):
+    """Убирает из кэша все закэшированные токены пользователя."""
+    user_key = USER_CACHE_KEY.format(user_id)
+    cache.delete_many([*cache.get(user_key, ()), user_key])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пользователя.
+
+    Пользователь токена хранится в кэше TOKEN_CACHE_TIMEOUT секунд, так
+    что авторизованный запрос не делает запрос Token JOIN User. Запись
+    удаляется сигналами при удалении токена (выход, удаление
+    пользователя) и при сохранении пользователя (смена пароля, профиля).
+    С кэшем в памяти процесса запись живёт TOKEN_CACHE_LOCAL_TIMEOUT.
+    """
+
+    def authenticate_credentials(self, key):
+        timeout = token_cache_timeout()
+        if timeout <= 0:
+            return super().authenticate_credentials(key)
+        cache_key = token_cache_key(key)
+        user = cache.get(cache_key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            user_key = USER_CACHE_KEY.format(user.pk)
+            cache.set_many({
+                cache_key: user,
+                user_key: {*cache.get(user_key, ()), cache_key},
+            }, timeout)
+            return user, token
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                'User inactive or deleted.')
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,446 @@
+"""Замер числа запросов и времени ответа для маршрутов api/urls.py."""
+import random
+import re
+import statistics
+import time
+from contextlib import contextmanager
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.urls import URLPattern, URLResolver
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import urls as api_urls
+from recipes import short_links
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription, User
+
+SIZES = {
+    'small': {'users': 20, 'recipes': 60, 'favorites': 100,
+              'carts': 50, 'subscriptions': 20},
+    'medium': {'users': 100, 'recipes': 500, 'favorites': 1000,
+               'carts': 500, 'subscriptions': 200},
+    'large': {'users': 500, 'recipes': 5000, 'favorites': 10000,
+              'carts': 5000, 'subscriptions': 1000},
+}
+SMALL_PAGE = 5
+LARGE_PAGE = 50
+INGREDIENTS_PER_RECIPE = 3
+BENCH_PASSWORD = 'bench-password'
+PNG_IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAAD'
+    'UlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+HTTP_METHODS = ('get', 'post', 'put', 'patch', 'delete')
+
+
+def _recipe_body(ctx):
+    return {
+        'name': 'Бенчмарк',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'image': PNG_IMAGE,
+        'tags': [ctx['tag']],
+        'ingredients': [{'id': ctx['ingredient'], 'amount': 5}],
+    }
+
+
+# Сценарии для каждой пары (метод, маршрут). Маршрут без сценария
+# считается непокрытым и валит прогон, чтобы новые эндпоинты не
+# проскальзывали мимо замеров.
+SCENARIOS = {
+    ('get', ''): {},
+    ('post', 'auth/token/login/'): {
+        'data': lambda ctx: {'email': ctx['email'],
+                             'password': BENCH_PASSWORD},
+    },
+    ('post', 'auth/token/logout/'): {},
+    ('get', 'users/me/'): {},
+    ('put', 'users/me/avatar/'): {
+        'data': lambda ctx: {'avatar': PNG_IMAGE},
+    },
+    ('delete', 'users/me/avatar/'): {},
+    ('post', 'users/set_password/'): {
+        'data': lambda ctx: {'current_password': BENCH_PASSWORD,
+                             'new_password': 'new-bench-password'},
+    },
+    ('post', 'users/<int:user_id>/subscribe/'): {
+        'kwargs': lambda ctx: {'user_id': ctx['not_subscribed']},
+    },
+    ('delete', 'users/<int:user_id>/subscribe/'): {
+        'kwargs': lambda ctx: {'user_id': ctx['subscribed']},
+    },
+    ('get', 'users/subscriptions/'): {'paged': True,
+                                      'query': {'recipes_limit': 3}},
+    ('post', 'recipes/<int:recipe_id>/favorite/'): {
+        'kwargs': lambda ctx: {'recipe_id': ctx['not_favorited']},
+    },
+    ('delete', 'recipes/<int:recipe_id>/favorite/'): {
+        'kwargs': lambda ctx: {'recipe_id': ctx['favorited']},
+    },
+    ('post', 'recipes/<int:recipe_id>/shopping_cart/'): {
+        'kwargs': lambda ctx: {'recipe_id': ctx['not_in_cart']},
+    },
+    ('delete', 'recipes/<int:recipe_id>/shopping_cart/'): {
+        'kwargs': lambda ctx: {'recipe_id': ctx['in_cart']},
+    },
+    ('get', 'recipes/download_shopping_cart/'): {},
+    ('get', 'recipes/shopping_cart_summary/'): {},
+    ('get', 'recipes/feed/'): {'paged': True},
+    ('get', 'recipes/popular/'): {
+        'paged': True,
+        'query': lambda ctx: {'tag': ctx['tag_slug']},
+    },
+    ('get', 'recipes/pantry/'): {
+        'paged': True,
+        'query': lambda ctx: {'ingredients': ctx['pantry']},
+    },
+    ('get', 'recipes/<int:recipe_id>/get-link/'): {
+        'kwargs': lambda ctx: {'recipe_id': ctx['recipe']},
+    },
+    ('get', 'users/'): {'paged': True},
+    ('post', 'users/'): {
+        'data': lambda ctx: {'email': 'new@bench.ru', 'username': 'new',
+                             'first_name': 'Имя', 'last_name': 'Фамилия',
+                             'password': BENCH_PASSWORD},
+    },
+    ('get', 'users/<pk>/'): {
+        'kwargs': lambda ctx: {'pk': ctx['subscribed']},
+    },
+    ('get', 'recipes/'): {'paged': True},
+    ('post', 'recipes/'): {'data': _recipe_body},
+    ('get', 'recipes/<pk>/'): {
+        'kwargs': lambda ctx: {'pk': ctx['recipe']},
+    },
+    ('patch', 'recipes/<pk>/'): {
+        'kwargs': lambda ctx: {'pk': ctx['own_recipe']},
+        'data': _recipe_body,
+    },
+    ('delete', 'recipes/<pk>/'): {
+        'kwargs': lambda ctx: {'pk': ctx['own_recipe']},
+    },
+    ('get', 'tags/'): {},
+    ('get', 'tags/<pk>/'): {'kwargs': lambda ctx: {'pk': ctx['tag']}},
+    ('get', 'ingredients/'): {'query': {'name': 'ингр'}},
+    ('get', 'ingredients/<pk>/'): {
+        'kwargs': lambda ctx: {'pk': ctx['ingredient']},
+    },
+    ('get', '_metrics'): {},
+    ('get', '<str:short_link>/'): {
+        'kwargs': lambda ctx: {'short_link': ctx['short_link']},
+        'latency': 1000,
+    },
+}
+
+
+def _route_from_regex(regex):
+    """Приводит регулярное выражение роутера к виду 'recipes/<pk>/'."""
+    route = re.sub(r'\(\?P<(\w+)>[^)]*\)', r'<\1>', regex)
+    return route.lstrip('^').rstrip('$')
+
+
+def _view_methods(callback):
+    actions = getattr(callback, 'actions', None)
+    view_class = getattr(callback, 'cls', None) or getattr(
+        callback, 'view_class', None)
+    allowed = getattr(view_class, 'http_method_names', HTTP_METHODS)
+    if actions is not None:
+        methods = actions.keys()
+    else:
+        methods = [method for method in HTTP_METHODS
+                   if hasattr(view_class, method)]
+    return [method for method in methods
+            if method in allowed and method in HTTP_METHODS]
+
+
+def collect_routes(patterns=None, prefix=''):
+    """Возвращает пары (метод, маршрут) из api/urls.py."""
+    if patterns is None:
+        patterns = api_urls.urlpatterns
+    routes = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            routes += collect_routes(
+                pattern.url_patterns,
+                prefix + _route_from_regex(str(pattern.pattern)),
+            )
+            continue
+        if not isinstance(pattern, URLPattern):
+            continue
+        route = prefix + _route_from_regex(str(pattern.pattern))
+        if '<format>' in route:
+            continue
+        for method in _view_methods(pattern.callback):
+            routes.append((method, route))
+    return sorted(set(routes), key=lambda item: (item[1], item[0]))
+
+
+def _unique_pairs(rng, count, left, right, exclude_same=False):
+    pairs = set()
+    limit = len(left) * len(right)
+    while len(pairs) < min(count, limit - (exclude_same and len(left))):
+        pair = (rng.choice(left), rng.choice(right))
+        if exclude_same and pair[0] == pair[1]:
+            continue
+        pairs.add(pair)
+    return pairs
+
+
+def seed(size, rng):
+    """Заполняет базу синтетическими данными и возвращает контекст."""
+    user_ids = list(range(1, size['users'] + 1))
+    recipe_ids = list(range(1, size['recipes'] + 1))
+    User.objects.bulk_create(
+        User(id=pk, username=f'bench{pk}', email=f'bench{pk}@bench.ru',
+             first_name='Имя', last_name='Фамилия', password=BENCH_PASSWORD)
+        for pk in user_ids
+    )
+    Tag.objects.bulk_create(
+        Tag(id=pk, name=f'Тэг {pk}', slug=f'tag{pk}') for pk in range(1, 4)
+    )
+    ingredient_ids = list(range(1, 51))
+    Ingredient.objects.bulk_create(
+        Ingredient(id=pk, name=f'ингредиент {pk}', measurement_unit='г')
+        for pk in ingredient_ids
+    )
+    Recipe.objects.bulk_create(
+        Recipe(id=pk, author_id=user_ids[pk % len(user_ids)],
+               name=f'Рецепт {pk}', text='Описание', cooking_time=pk % 60 + 1,
+               short_link=None)
+        for pk in recipe_ids
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            id=(pk - 1) * INGREDIENTS_PER_RECIPE + offset + 1,
+            name_id=ingredient_ids[(pk + offset) % len(ingredient_ids)],
+            amount=offset + 1, measurement_unit='г')
+        for pk in recipe_ids for offset in range(INGREDIENTS_PER_RECIPE)
+    )
+    Recipe.ingredients.through.objects.bulk_create(
+        Recipe.ingredients.through(
+            recipe_id=pk,
+            recipeingredient_id=(pk - 1) * INGREDIENTS_PER_RECIPE + offset + 1)
+        for pk in recipe_ids for offset in range(INGREDIENTS_PER_RECIPE)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=pk, tag_id=pk % 3 + 1)
+        for pk in recipe_ids
+    )
+    user = user_ids[0]
+    free_recipe = recipe_ids[-1]
+    favorites = _unique_pairs(rng, size['favorites'], user_ids, recipe_ids)
+    favorites = {pair for pair in favorites if pair != (user, free_recipe)}
+    favorites.add((user, recipe_ids[0]))
+    Favorite.objects.bulk_create(
+        Favorite(user_id=user_id, recipe_id=recipe_id)
+        for user_id, recipe_id in favorites
+    )
+    carts = _unique_pairs(rng, size['carts'], user_ids, recipe_ids)
+    carts = {pair for pair in carts if pair != (user, free_recipe)}
+    carts.add((user, recipe_ids[0]))
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+        for user_id, recipe_id in carts
+    )
+    free_author = user_ids[-1]
+    subscriptions = _unique_pairs(rng, size['subscriptions'], user_ids,
+                                  user_ids, exclude_same=True)
+    subscriptions = {pair for pair in subscriptions
+                     if pair != (user, free_author)}
+    subscriptions.add((user, user_ids[1]))
+    Subscription.objects.bulk_create(
+        Subscription(user_id=user_id, subscribing_id=subscribing_id)
+        for user_id, subscribing_id in subscriptions
+    )
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+                no_style(),
+                [User, Tag, Ingredient, Recipe, RecipeIngredient, Favorite,
+                 ShoppingCart, Subscription]):
+            cursor.execute(sql)
+    call_command('rebuild_shopping_carts', stdout=StringIO())
+    call_command('recount_counters', stdout=StringIO())
+    call_command('rebuild_feeds', stdout=StringIO())
+    call_command('rebuild_search_index', stdout=StringIO())
+    call_command('decay_popularity', '--recompute', stdout=StringIO())
+    own_recipe = Recipe.objects.filter(author_id=user).exclude(
+        id=recipe_ids[0]).values_list('id', flat=True).first()
+    return {
+        'user': user,
+        'email': f'bench{user}@bench.ru',
+        'token': Token.objects.create(user_id=user).key,
+        'recipe': recipe_ids[0],
+        'own_recipe': own_recipe,
+        'favorited': recipe_ids[0],
+        'not_favorited': free_recipe,
+        'in_cart': recipe_ids[0],
+        'not_in_cart': free_recipe,
+        'subscribed': user_ids[1],
+        'not_subscribed': free_author,
+        'tag': 1,
+        'tag_slug': 'tag1',
+        'ingredient': 1,
+        'pantry': ','.join(str(pk) for pk in ingredient_ids[:10]),
+        'short_link': short_links.encode(recipe_ids[0]),
+    }
+
+
+def build_url(route, kwargs):
+    path = route
+    for key, value in kwargs.items():
+        path = re.sub(rf'<(\w+:)?{key}>', str(value), path)
+    return f'/api/{path}'
+
+
+class QueryRecorder:
+    """Считает запросы и время их выполнения."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+@contextmanager
+def rollback():
+    """Откатывает все изменения, сделанные внутри блока."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def measure(client, method, url, data, query, repeat):
+    """Выполняет запрос repeat раз и возвращает медианные замеры.
+
+    Первый повтор идёт с пустым кэшем, поэтому число запросов (максимум
+    по повторам) отражает холодный путь, а время — в основном тёплый.
+    """
+    cache.clear()
+    short_links.resolve.cache_clear()
+    runs = []
+    kwargs = {'data': data, 'format': 'json'} if data else {}
+    if query:
+        url = f'{url}?' + '&'.join(
+            f'{key}={value}' for key, value in query.items())
+    for _ in range(repeat):
+        recorder = QueryRecorder()
+        with rollback(), connection.execute_wrapper(recorder):
+            start = time.perf_counter()
+            response = getattr(client, method)(url, **kwargs)
+            if hasattr(response, 'streaming_content'):
+                b''.join(response.streaming_content)
+            wall = time.perf_counter() - start
+        runs.append((response.status_code, recorder.count,
+                     recorder.duration, wall))
+    return {
+        'status': runs[-1][0],
+        'queries': max(run[1] for run in runs),
+        'sql_ms': round(statistics.median(run[2] for run in runs) * 1000, 3),
+        'wall_ms': round(statistics.median(run[3] for run in runs) * 1000, 3),
+    }
+
+
+def latency(client, method, url, count):
+    """Выполняет count тёплых запросов и возвращает перцентили задержки."""
+    durations = []
+    with rollback():
+        for _ in range(count):
+            start = time.perf_counter()
+            getattr(client, method)(url)
+            durations.append(time.perf_counter() - start)
+    durations.sort()
+    return {
+        'p50_us': round(durations[len(durations) // 2] * 1e6, 1),
+        'p99_us': round(durations[int(len(durations) * 0.99)] * 1e6, 1),
+    }
+
+
+def run(size, repeat=3, seed_value=0):
+    """Засевает данные размера size и замеряет все маршруты."""
+    results = {}
+    uncovered = []
+    with rollback():
+        ctx = seed(size, random.Random(seed_value))
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.credentials(HTTP_AUTHORIZATION=f'Token {ctx["token"]}')
+        for client in (anonymous, authenticated):
+            client.raise_request_exception = False
+        for method, route in collect_routes():
+            scenario = SCENARIOS.get((method, route))
+            if scenario is None:
+                uncovered.append(f'{method.upper()} {route}')
+                continue
+            url = build_url(route, scenario.get('kwargs', dict)(ctx))
+            data = scenario.get('data', lambda ctx: None)(ctx)
+            limits = [SMALL_PAGE, LARGE_PAGE] if scenario.get('paged') else [
+                None]
+            for auth, client in (('anon', anonymous),
+                                 ('auth', authenticated)):
+                for limit in limits:
+                    query = scenario.get('query', {})
+                    if callable(query):
+                        query = query(ctx)
+                    query = dict(query)
+                    if limit:
+                        query['limit'] = limit
+                    key = f'{method.upper()} /{route} [{auth}]'
+                    if limit:
+                        key += f' limit={limit}'
+                    results[key] = measure(client, method, url, data, query,
+                                           repeat)
+                    if scenario.get('latency'):
+                        results[key].update(latency(
+                            client, method, url, scenario['latency']))
+    return results, uncovered
+
+
+def growth_failures(results, allow_growth=()):
+    """Находит эндпоинты, у которых число запросов растёт с размером
+    страницы."""
+    failures = []
+    for key, small in results.items():
+        if not key.endswith(f' limit={SMALL_PAGE}'):
+            continue
+        base = key[:-len(f' limit={SMALL_PAGE}')]
+        large = results.get(f'{base} limit={LARGE_PAGE}')
+        endpoint = base.rsplit(' [', 1)[0]
+        if large is None or endpoint in allow_growth:
+            continue
+        if large['queries'] > small['queries']:
+            failures.append(
+                f'{base}: {small["queries"]} запросов при limit={SMALL_PAGE},'
+                f' {large["queries"]} при limit={LARGE_PAGE}'
+            )
+    return failures
+
+
+def status_failures(results):
+    """Находит сценарии, на которых сервер ответил ошибкой 5xx."""
+    return [f'{key}: код {result["status"]}'
+            for key, result in results.items() if result['status'] >= 500]
+
+
+def baseline_failures(results, baseline):
+    """Сравнивает число запросов с сохранённой базовой линией."""
+    failures = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if expected is not None and result['queries'] > expected['queries']:
+            failures.append(
+                f'{key}: {result["queries"]} запросов, '
+                f'в базовой линии {expected["queries"]}'
+            )
+    return failures
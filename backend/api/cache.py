@@ -0,0 +1,76 @@
+import hashlib
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Max
+
+from recipes.models import Ingredient, Recipe, Tag
+
+NAMESPACES = ('recipes', 'tags', 'ingredients', 'authors', 'popular')
+VERSION_KEY = 'version:{}'
+MODIFIED_KEY = 'modified:{}'
+# Модели, по updated_at которых восстанавливается время изменения
+# пространства, если его нет в кэше.
+MODIFIED_MODELS = {'recipes': Recipe, 'tags': Tag, 'ingredients': Ingredient}
+
+
+def is_process_local():
+    """Проверяет, что кэш по умолчанию свой у каждого процесса."""
+    return isinstance(caches['default'], LocMemCache)
+
+
+def _initial_version():
+    # Счётчик, потерянный кэшем, не должен вернуться к старому значению,
+    # иначе снова станут видны записи, собранные до вытеснения.
+    return time.time_ns()
+
+
+def get_versions(namespaces):
+    """Возвращает текущие версии пространств имён."""
+    keys = [VERSION_KEY.format(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _saved_modified(namespace):
+    updated_at = None
+    if namespace in MODIFIED_MODELS:
+        updated_at = MODIFIED_MODELS[namespace].objects.aggregate(
+            updated_at=Max('updated_at'))['updated_at']
+    return int(updated_at.timestamp()) if updated_at else int(time.time())
+
+
+def get_modified(namespaces):
+    """Возвращает Unix-время последнего изменения пространств имён."""
+    keys = {MODIFIED_KEY.format(namespace): namespace
+            for namespace in namespaces}
+    modified = cache.get_many(keys)
+    for key, namespace in keys.items():
+        if key not in modified:
+            cache.add(key, _saved_modified(namespace), timeout=None)
+            modified[key] = cache.get(key) or int(time.time())
+    return max(modified.values(), default=None)
+
+
+def bump(*namespaces):
+    """Увеличивает версии, после чего старые записи больше не читаются."""
+    now = int(time.time())
+    for namespace in namespaces:
+        key = VERSION_KEY.format(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+        cache.set(MODIFIED_KEY.format(namespace), now, timeout=None)
+
+
+def response_key(prefix, url, namespaces):
+    """Ключ ответа с версиями всех пространств, от которых он зависит."""
+    versions = '.'.join(str(version) for version in get_versions(namespaces))
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f'response:{prefix}:{digest}:{versions}'
@@ -1,6 +1,9 @@
+from django.conf import settings
 from django_filters import rest_framework as filters
+from django_filters import utils
 
-from recipes.models import Recipe, Tag
+from api.recipe_index import IndexedRecipes, recipe_index
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
 
 
 class RecipeFilter(filters.FilterSet):
@@ -12,10 +15,12 @@ class RecipeFilter(filters.FilterSet):
     is_favorited = filters.CharFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.CharFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search']
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -30,3 +35,49 @@ class RecipeFilter(filters.FilterSet):
             if value == '1':
                 return queryset.filter(shoppingcart__user=user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return queryset.search(value)
+
+
+class RecipeIndexFilterBackend(filters.DjangoFilterBackend):
+    """Фильтрует список рецептов по индексу в памяти процесса.
+
+    Включается RECIPE_FILTER_ENGINE=index. Тэги и автор берутся из
+    recipe_index, избранное и список покупок — одним запросом id
+    рецептов пользователя, а база читает только рецепты страницы.
+    Запросы с параметрами, которых нет в индексе (search), фильтруются
+    базой как обычно.
+    """
+
+    indexed_params = {'tags', 'author', 'is_favorited',
+                      'is_in_shopping_cart'}
+    page_params = {'limit', 'offset', 'page', 'cursor'}
+
+    def filter_queryset(self, request, queryset, view):
+        params = set(request.query_params)
+        if (settings.RECIPE_FILTER_ENGINE != 'index'
+                or getattr(view, 'action', None) != 'list'
+                or not params & self.indexed_params
+                or params - self.indexed_params - self.page_params):
+            return super().filter_queryset(request, queryset, view)
+        filterset = self.get_filterset(request, queryset, view)
+        if not filterset.is_valid() and self.raise_exception:
+            raise utils.translate_validation(filterset.errors)
+        data = filterset.form.cleaned_data
+        user = request.user
+        recipe_ids = None
+        for name, model in (('is_favorited', Favorite),
+                            ('is_in_shopping_cart', ShoppingCart)):
+            if data.get(name) == '1' and user.is_authenticated:
+                user_recipes = set(model.objects.filter(
+                    user=user).values_list('recipe_id', flat=True))
+                recipe_ids = (user_recipes if recipe_ids is None
+                              else recipe_ids & user_recipes)
+        author = data.get('author')
+        ids = recipe_index.filter(
+            tag_ids=[tag.id for tag in data.get('tags') or ()],
+            author_id=author.id if author else None,
+            recipe_ids=recipe_ids,
+        )
+        return IndexedRecipes(queryset, ids)
@@ -0,0 +1,264 @@
+"""Нагрузочный прогон по сценариям postman-коллекции.
+
+Каждый виртуальный пользователь проходит JOURNEY: регистрируется,
+получает токен, создаёт рецепт, добавляет его в избранное и список
+покупок, скачивает список и удаляет рецепт. Запросы берутся из
+postman_collection/foodgram.postman_collection.json вместе с телами,
+авторизацией и ожидаемыми кодами ответа; переменные, которые в Postman
+выставляют JS-тесты, здесь достаются из ответов по путям JOURNEY.
+"""
+import http.client
+import json
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+VARIABLE = re.compile(r'\{\{(\w+)\}\}')
+EXPECTED_STATUS = re.compile(r'to\.be\.eql\("([\w ]+)"\)')
+STATUS_BY_PHRASE = {status.phrase: status.value for status in HTTPStatus}
+PERCENTILES = (50, 95, 99)
+
+# Шаги сценария: путь запроса в коллекции и переменные, которые нужно
+# взять из ответа ('0.id' — поле id первого элемента списка).
+JOURNEY = (
+    ('register_and_get_tokens // No Auth/create_users/create_first_user',
+     {'userId': 'id'}),
+    ('register_and_get_tokens // No Auth/get_tokens/'
+     'get_token_for_first_user', {'userToken': 'auth_token'}),
+    ('tags/get_tags_info/get_tag_list // User',
+     {'firstTagId': '0.id', 'secondTagId': '1.id',
+      'secondTagSlug': '1.slug', 'thirdTagSlug': '2.slug'}),
+    ('ingredients/get_ingradients/get_ingredients_list // User',
+     {'firstIndredientId': '0.id', 'secondIndredientId': '1.id'}),
+    ('recipes/create_recipes/create_fifth_recipe // User',
+     {'firstRecipeId': 'id', 'fifthRecipeId': 'id'}),
+    ('recipes/get_recipes/get_recipes_list // User', {}),
+    ('recipes/get_recipes/get_recipes_list_with_two_tags_param // User', {}),
+    ('recipes/get_recipes/get_recipe_detail // User', {}),
+    ('favorite/add_to_favorite/add_to_favorite // User', {}),
+    ('shopping_cart/add_to_shopping_cart/add_to_shopping_cart // User', {}),
+    ('recipe_filters_for_favorite_and_shopping_cart/'
+     'get_recipes_list_with_is_favorited_param // User', {}),
+    ('shopping_cart/download_shopping_cart/download_shopping_cart // User',
+     {}),
+    ('delete_requests/recipes/delete_fifth_recipe // Second User', {}),
+)
+
+
+class JourneyError(Exception):
+    """Шаг сценария не удался, и продолжать его нельзя."""
+
+
+def substitute(text, variables):
+    return VARIABLE.sub(
+        lambda match: str(variables.get(match.group(1), match.group(0))),
+        text)
+
+
+def extract(data, path):
+    for key in path.split('.'):
+        data = data[int(key)] if isinstance(data, list) else data[key]
+    return data
+
+
+class Step:
+    """Запрос коллекции, подготовленный к повторению."""
+
+    def __init__(self, path, item, auth):
+        request = item['request']
+        self.path = path
+        self.method = request['method']
+        url = request['url']
+        self.url = url['raw'] if isinstance(url, dict) else url
+        body = request.get('body') or {}
+        self.body = body.get('raw') if body.get('mode') == 'raw' else None
+        self.headers = {header['key']: header['value']
+                        for header in request.get('header', ())
+                        if not header.get('disabled')}
+        if auth and auth.get('type') == 'apikey':
+            fields = {field['key']: field['value']
+                      for field in auth['apikey']}
+            self.headers[fields['key']] = fields['value']
+        if self.body:
+            self.headers.setdefault('Content-Type', 'application/json')
+        tests = '\n'.join(line for event in item.get('event', ())
+                          if event['listen'] == 'test'
+                          for line in event['script']['exec'])
+        phrases = EXPECTED_STATUS.findall(tests)
+        self.expected = STATUS_BY_PHRASE.get(phrases[0]) if phrases else None
+        self.name = f'{self.method} {self.url.replace("{{baseUrl}}", "")}'
+
+
+def load_collection(path):
+    """Возвращает {путь в коллекции: Step}."""
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+    steps = {}
+
+    def walk(items, prefix, auth):
+        for item in items:
+            path = f'{prefix}{item["name"]}'
+            item_auth = item.get('auth') or (
+                item.get('request', {}).get('auth')) or auth
+            if 'item' in item:
+                walk(item['item'], f'{path}/', item_auth)
+            else:
+                steps[path] = Step(path, item, item_auth)
+
+    walk(collection['item'], '', collection.get('auth'))
+    variables = {variable['key']: variable['value']
+                 for variable in collection.get('variable', ())}
+    return steps, variables
+
+
+class Stats:
+    """Задержки и ошибки по эндпоинтам, общие для всех потоков."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.journeys = {'completed': 0, 'failed': 0}
+
+    def add(self, name, duration, status, ok):
+        with self.lock:
+            self.durations[name].append(duration)
+            self.statuses[name][status] += 1
+            if not ok:
+                self.errors[name] += 1
+
+    def finish_journey(self, ok):
+        with self.lock:
+            self.journeys['completed' if ok else 'failed'] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        total = 0
+        for name, durations in self.durations.items():
+            durations = sorted(durations)
+            total += len(durations)
+            result = {
+                'count': len(durations),
+                'errors': self.errors[name],
+                'error_rate': round(self.errors[name] / len(durations), 4),
+                'rps': round(len(durations) / elapsed, 2),
+                'statuses': {str(status): count for status, count
+                             in sorted(self.statuses[name].items())},
+            }
+            for percentile in PERCENTILES:
+                index = min(len(durations) - 1,
+                            int(len(durations) * percentile / 100))
+                result[f'p{percentile}_ms'] = round(
+                    durations[index] * 1000, 1)
+            result['max_ms'] = round(durations[-1] * 1000, 1)
+            endpoints[name] = result
+        errors = sum(self.errors.values())
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'requests': total,
+            'rps': round(total / elapsed, 2),
+            'error_rate': round(errors / total, 4) if total else 0,
+            'journeys': dict(self.journeys),
+            'endpoints': endpoints,
+        }
+
+
+class VirtualUser:
+    """Проходит сценарий через своё HTTP-соединение."""
+
+    def __init__(self, base_url, steps, variables, stats, timeout):
+        parts = urlsplit(base_url)
+        connection_class = (http.client.HTTPSConnection
+                            if parts.scheme == 'https'
+                            else http.client.HTTPConnection)
+        self.connection = connection_class(parts.netloc, timeout=timeout)
+        self.base_url = base_url.rstrip('/')
+        self.steps = steps
+        self.defaults = variables
+        self.stats = stats
+
+    def request(self, step, variables):
+        url = substitute(step.url, variables)
+        parts = urlsplit(url)
+        target = parts.path + (f'?{parts.query}' if parts.query else '')
+        body = substitute(step.body, variables) if step.body else None
+        headers = {key: substitute(value, variables)
+                   for key, value in step.headers.items()}
+        start = time.perf_counter()
+        try:
+            self.connection.request(
+                step.method, target,
+                body=body.encode() if body is not None else None,
+                headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            content = b''
+            status = 0
+        duration = time.perf_counter() - start
+        ok = status == step.expected if step.expected else 0 < status < 400
+        self.stats.add(step.name, duration, status, ok)
+        if not ok:
+            raise JourneyError(f'{step.name}: код {status}')
+        return content
+
+    def run_journey(self):
+        suffix = uuid.uuid4().hex[:12]
+        variables = dict(self.defaults)
+        variables.update({
+            'baseUrl': self.base_url,
+            'email': json.dumps(f'load-{suffix}@foodgram.test'),
+            'username': json.dumps(f'load-{suffix}'),
+        })
+        try:
+            for path, extracts in JOURNEY:
+                content = self.request(self.steps[path], variables)
+                if extracts:
+                    data = json.loads(content)
+                    for name, source in extracts.items():
+                        variables[name] = extract(data, source)
+        except (JourneyError, ValueError, KeyError, IndexError):
+            self.stats.finish_journey(False)
+            return
+        self.stats.finish_journey(True)
+
+
+def run(base_url, collection_path, users, ramp_up=0, iterations=1,
+        duration=None, timeout=30):
+    """Запускает users виртуальных пользователей и возвращает отчёт.
+
+    Пользователи стартуют равномерно в течение ramp_up секунд. Каждый
+    проходит сценарий iterations раз, а если задана duration — повторяет
+    его, пока не истечёт duration секунд от начала прогона.
+    """
+    steps, variables = load_collection(collection_path)
+    missing = [path for path, _ in JOURNEY if path not in steps]
+    if missing:
+        raise KeyError(f'В коллекции нет запросов: {", ".join(missing)}')
+    stats = Stats()
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    def worker(number):
+        time.sleep(ramp_up * number / users)
+        user = VirtualUser(base_url, steps, variables, stats, timeout)
+        done = 0
+        while (time.perf_counter() < deadline if deadline
+               else done < iterations):
+            user.run_journey()
+            done += 1
+        user.connection.close()
+
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        for future in [pool.submit(worker, number)
+                       for number in range(users)]:
+            future.result()
+    return stats.report(time.perf_counter() - start)
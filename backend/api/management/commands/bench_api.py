@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+
+from api import benchmarks
+
+BASELINE_PATH = os.path.join(settings.BASE_DIR, 'data', 'bench_baseline.json')
+
+
+class Command(BaseCommand):
+    help = ('Замерить число запросов и время ответа всех маршрутов API '
+            'и сравнить с базовой линией')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', action='append',
+                            choices=sorted(benchmarks.SIZES),
+                            help='Размер набора данных, можно несколько раз')
+        for name in ('users', 'recipes', 'favorites', 'carts',
+                     'subscriptions'):
+            parser.add_argument(f'--{name}', type=int,
+                                help=f'Переопределить число {name}')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Повторов каждого запроса')
+        parser.add_argument('--baseline', default=BASELINE_PATH,
+                            help='Путь к файлу базовой линии')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Перезаписать базовую линию')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        sizes = options['size'] or ['small']
+        baseline = self.load_baseline(options['baseline'])
+        setup_test_environment()
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True)
+        report = {}
+        server_errors = []
+        failures = []
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root):
+                for name in sizes:
+                    size = dict(benchmarks.SIZES[name])
+                    size.update({key: options[key] for key in size
+                                 if options.get(key) is not None})
+                    results, uncovered = benchmarks.run(size,
+                                                        options['repeat'])
+                    report[name] = results
+                    self.print_table(name, results)
+                    failures += [f'Маршрут без сценария: {route}'
+                                 for route in uncovered]
+                    server_errors += benchmarks.status_failures(results)
+                    failures += benchmarks.growth_failures(
+                        results, baseline.get('allow_growth', []))
+                    failures += benchmarks.baseline_failures(
+                        results, baseline.get('sizes', {}).get(name, {}))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        # Ответ 5xx — это ошибка, а не базовая линия: её не сохраняем.
+        if options['update_baseline'] and not server_errors:
+            self.save_baseline(options['baseline'], baseline, report)
+            self.stdout.write(self.style.SUCCESS('Базовая линия обновлена'))
+            return
+        failures = server_errors + failures
+        if failures:
+            for failure in failures:
+                self.stdout.write(self.style.ERROR(failure))
+            raise CommandError(f'Регрессий: {len(failures)}')
+        self.stdout.write(self.style.SUCCESS('Регрессий не найдено'))
+
+    def load_baseline(self, path):
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def save_baseline(self, path, baseline, report):
+        sizes = baseline.setdefault('sizes', {})
+        for name, results in report.items():
+            sizes[name] = {
+                key: {'queries': result['queries'],
+                      'wall_ms': result['wall_ms']}
+                for key, result in results.items()
+            }
+        baseline.setdefault('allow_growth', [])
+        with open(path, 'w') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2,
+                      sort_keys=True)
+            f.write('\n')
+
+    def print_table(self, name, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Размер: {name}'))
+        width = max(len(key) for key in results)
+        self.stdout.write(
+            f'{"эндпоинт":<{width}}  код  запросы   sql, мс  всего, мс')
+        for key, result in results.items():
+            self.stdout.write(
+                f'{key:<{width}}  {result["status"]:>3}  '
+                f'{result["queries"]:>7}  {result["sql_ms"]:>8}  '
+                f'{result["wall_ms"]:>9}'
+            )
+        for key, result in results.items():
+            if 'p50_us' in result:
+                self.stdout.write(
+                    f'Задержка {key}: p50 {result["p50_us"]} мкс, '
+                    f'p99 {result["p99_us"]} мкс'
+                )
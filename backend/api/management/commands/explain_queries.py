@@ -0,0 +1,122 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, migrations
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.test.utils import setup_test_environment
+
+from api import benchmarks, query_plans
+
+
+class Command(BaseCommand):
+    help = ('Разобрать планы горячих запросов API, сравнить их со снимком '
+            'и предложить недостающие индексы')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', default='medium',
+                            choices=sorted(benchmarks.SIZES),
+                            help='Размер набора данных')
+        parser.add_argument('--min-rows', type=int,
+                            default=query_plans.MIN_ROWS,
+                            help='С какого числа строк таблица считается '
+                                 'большой')
+        parser.add_argument('--snapshot', default=query_plans.SNAPSHOT_PATH,
+                            help='Путь к файлу снимков планов')
+        parser.add_argument('--update-snapshot', action='store_true',
+                            help='Перезаписать снимок планов')
+        parser.add_argument('--write-migrations', action='store_true',
+                            help='Записать предложенные индексы в миграции')
+
+    def handle(self, *args, **options):
+        if not query_plans.is_supported():
+            raise CommandError(
+                f'EXPLAIN не поддерживается для базы {connection.vendor}')
+        snapshots = query_plans.load_snapshots(options['snapshot'])
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True)
+        try:
+            with benchmarks.rollback():
+                ctx = query_plans.seed(options['size'])
+                report = query_plans.run(ctx, query_plans.table_sizes(),
+                                         options['min_rows'])
+                self.print_report(report)
+                proposals = [proposal for entry in report.values()
+                             for proposal in entry['proposals']]
+                migration_files = self.build_migrations(proposals)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for path, text in migration_files:
+            if options['write_migrations']:
+                with open(path, 'w') as f:
+                    f.write(text)
+                self.stdout.write(self.style.SUCCESS(f'Записана {path}'))
+            else:
+                self.stdout.write(self.style.MIGRATE_HEADING(path))
+                self.stdout.write(text)
+        if migration_files and not options['write_migrations']:
+            self.stdout.write('Не забудьте перенести индексы в Meta.indexes '
+                              'моделей, иначе makemigrations их удалит')
+
+        saved = snapshots.get(connection.vendor, {})
+        if options['update_snapshot']:
+            snapshots[connection.vendor] = {
+                name: {'plan': entry['plan'], 'findings': entry['findings']}
+                for name, entry in report.items()
+            }
+            self.save_snapshots(options['snapshot'], snapshots)
+            self.stdout.write(self.style.SUCCESS('Снимок планов обновлён'))
+            return
+        for name, entry in report.items():
+            if name in saved and saved[name]['plan'] != entry['plan']:
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: план изменился'))
+        failures = query_plans.snapshot_failures(report, saved)
+        if failures:
+            for failure in failures:
+                self.stdout.write(self.style.ERROR(failure))
+            raise CommandError(f'Регрессий планов: {len(failures)}')
+        self.stdout.write(self.style.SUCCESS('Регрессий планов не найдено'))
+
+    def save_snapshots(self, path, snapshots):
+        with open(path, 'w') as f:
+            json.dump(snapshots, f, ensure_ascii=False, indent=2,
+                      sort_keys=True)
+            f.write('\n')
+
+    def print_report(self, report):
+        for name, entry in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for line in entry['plan']:
+                self.stdout.write(f'  {line}')
+            for finding in entry['findings']:
+                self.stdout.write(self.style.WARNING(f'  ! {finding}'))
+            for note in entry['notes']:
+                self.stdout.write(f'  ? {note}')
+            for model, index in entry['proposals']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'  + {model.__name__}: {index.name} '
+                    f'({", ".join(index.fields)})'))
+
+    def build_migrations(self, proposals):
+        """Собирает по миграции AddIndex на каждое приложение."""
+        by_app = {}
+        for model, index in proposals:
+            by_app.setdefault(model._meta.app_label, []).append(
+                migrations.AddIndex(model_name=model._meta.model_name,
+                                    index=index))
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        files = []
+        for app_label, operations in by_app.items():
+            leaf = loader.graph.leaf_nodes(app_label)[0]
+            number = MigrationAutodetector.parse_number(leaf[1]) + 1
+            migration = migrations.Migration(
+                f'{number:04d}_query_plan_indexes', app_label)
+            migration.dependencies = [leaf]
+            migration.operations = operations
+            writer = MigrationWriter(migration)
+            files.append((writer.path, writer.as_string()))
+        return files
@@ -0,0 +1,83 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import load_testing
+
+COLLECTION_PATH = os.path.join(
+    os.path.dirname(settings.BASE_DIR), 'postman_collection',
+    'foodgram.postman_collection.json')
+
+
+class Command(BaseCommand):
+    help = ('Нагрузить запущенный сервер сценариями postman-коллекции и '
+            'показать пропускную способность и задержки по эндпоинтам')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000',
+                            help='Адрес запущенного сервера')
+        parser.add_argument('--collection', default=COLLECTION_PATH,
+                            help='Путь к postman-коллекции')
+        parser.add_argument('--users', type=int, default=10,
+                            help='Число одновременных пользователей')
+        parser.add_argument('--ramp-up', type=float, default=0,
+                            help='За сколько секунд запустить всех '
+                                 'пользователей')
+        parser.add_argument('--iterations', type=int, default=5,
+                            help='Сколько раз каждый пользователь проходит '
+                                 'сценарий')
+        parser.add_argument('--duration', type=float,
+                            help='Гонять сценарий столько секунд вместо '
+                                 '--iterations')
+        parser.add_argument('--timeout', type=float, default=30,
+                            help='Таймаут одного запроса, с')
+        parser.add_argument('--max-error-rate', type=float,
+                            help='Упасть, если доля ошибок выше')
+        parser.add_argument('--output', help='Сохранить отчёт в JSON')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users должно быть положительным')
+        try:
+            report = load_testing.run(
+                options['base_url'], options['collection'],
+                users=options['users'], ramp_up=options['ramp_up'],
+                iterations=options['iterations'],
+                duration=options['duration'], timeout=options['timeout'],
+            )
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f'Ошибка: {e}')
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        max_error_rate = options['max_error_rate']
+        if max_error_rate is not None and report['error_rate'] > (
+                max_error_rate):
+            raise CommandError(
+                f'Доля ошибок {report["error_rate"]} выше {max_error_rate}')
+
+    def print_report(self, report):
+        endpoints = report['endpoints']
+        width = max((len(name) for name in endpoints), default=8)
+        self.stdout.write(
+            f'{"эндпоинт":<{width}}  запросов  ошибок   rps   '
+            'p50, мс   p95, мс   p99, мс')
+        for name, result in endpoints.items():
+            self.stdout.write(
+                f'{name:<{width}}  {result["count"]:>8}  '
+                f'{result["errors"]:>6}  {result["rps"]:>5}  '
+                f'{result["p50_ms"]:>8}  {result["p95_ms"]:>8}  '
+                f'{result["p99_ms"]:>8}'
+            )
+        journeys = report['journeys']
+        style = self.style.ERROR if report['error_rate'] else (
+            self.style.SUCCESS)
+        self.stdout.write(style(
+            f'{report["requests"]} запросов за {report["elapsed_s"]} с, '
+            f'{report["rps"]} запросов/с, ошибок {report["error_rate"]:.2%}; '
+            f'сценариев пройдено {journeys["completed"]}, '
+            f'сорвалось {journeys["failed"]}'
+        ))
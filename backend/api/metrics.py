@@ -0,0 +1,142 @@
+"""Замеры запросов: Server-Timing и гистограммы по маршрутам."""
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache
+
+METRIC_PREFIX = 'foodgram_'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+HISTOGRAMS = {
+    'request_duration_seconds': ('Время обработки запроса',
+                                 DURATION_BUCKETS),
+    'sql_duration_seconds': ('Время SQL-запросов за запрос',
+                             DURATION_BUCKETS),
+    'serializer_duration_seconds': ('Время сериализации за запрос',
+                                    DURATION_BUCKETS),
+    'sql_queries': ('Число SQL-запросов за запрос', QUERY_BUCKETS),
+}
+UNMATCHED_ROUTE = 'unmatched'
+
+current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Счётчики одного запроса."""
+
+    __slots__ = ('queries', 'sql', 'serializer', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.serializer = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - start
+            self.queries += 1
+
+
+class TimedSerializerMixin:
+    """Добавляет время to_representation к счётчикам текущего запроса.
+
+    Вложенные сериализаторы не засекаются повторно: время считается
+    только у самого внешнего вызова.
+    """
+
+    def to_representation(self, instance):
+        stats = current.get()
+        if stats is None or stats.serializing:
+            return super().to_representation(instance)
+        stats.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer += time.perf_counter() - start
+            stats.serializing = False
+
+
+@lru_cache(maxsize=None)
+def route_label(route):
+    """Приводит маршрут резолвера к виду 'api/recipes/<pk>/'."""
+    if route is None:
+        return UNMATCHED_ROUTE
+    route = re.sub(r'\(\?P<(\w+)>[^)]*\)', r'<\1>', route)
+    return route.replace('^', '').replace('$', '')
+
+
+class Registry:
+    """Гистограммы в памяти процесса.
+
+    Каждое наблюдение — это бинарный поиск корзины и несколько
+    сложений под блокировкой, поэтому замеры можно не выключать.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._requests = {}
+
+    def observe(self, method, route, status, total, stats):
+        labels = (method, route)
+        values = {
+            'request_duration_seconds': total,
+            'sql_duration_seconds': stats.sql,
+            'serializer_duration_seconds': stats.serializer,
+            'sql_queries': stats.queries,
+        }
+        with self._lock:
+            key = labels + (status,)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            for name, value in values.items():
+                buckets = HISTOGRAMS[name][1]
+                histogram = self._histograms.get((name, labels))
+                if histogram is None:
+                    histogram = self._histograms[(name, labels)] = [
+                        [0] * (len(buckets) + 1), 0]
+                histogram[0][bisect_left(buckets, value)] += 1
+                histogram[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._requests.clear()
+
+    def render(self):
+        """Возвращает гистограммы в текстовом формате Prometheus."""
+        with self._lock:
+            histograms = {key: (list(counts), total) for key, (counts, total)
+                          in self._histograms.items()}
+            requests = dict(self._requests)
+        name = f'{METRIC_PREFIX}requests_total'
+        lines = [f'# HELP {name} Число обработанных запросов',
+                 f'# TYPE {name} counter']
+        for (method, route, status), count in sorted(requests.items()):
+            lines.append(f'{name}{{method="{method}",route="{route}",'
+                         f'status="{status}"}} {count}')
+        for metric, (help_text, buckets) in HISTOGRAMS.items():
+            name = METRIC_PREFIX + metric
+            lines += [f'# HELP {name} {help_text}',
+                      f'# TYPE {name} histogram']
+            for (key, labels), (counts, total) in sorted(histograms.items()):
+                if key != metric:
+                    continue
+                label = 'method="{}",route="{}"'.format(*labels)
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} '
+                                 f'{cumulative}')
+                lines += [f'{name}_sum{{{label}}} {total}',
+                          f'{name}_count{{{label}}} {cumulative}']
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
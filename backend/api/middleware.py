@@ -0,0 +1,76 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from api import metrics
+from api.nplusone import Detector, NPlusOneError
+
+logger = logging.getLogger('api.nplusone')
+
+
+class ServerTimingMiddleware:
+    """Замеряет запрос: число и время SQL, сериализацию и общее время.
+
+    Замеры отдаются заголовком Server-Timing и попадают в гистограммы
+    маршрута, которые показывает /api/_metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.SERVER_TIMING_ENABLED:
+            return self.get_response(request)
+        stats = metrics.RequestStats()
+        token = metrics.current.set(stats)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats):
+                response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        total = time.perf_counter() - start
+        response['Server-Timing'] = (
+            f'db;desc="{stats.queries} queries";dur={stats.sql * 1000:.2f}, '
+            f'serializer;dur={stats.serializer * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        match = request.resolver_match
+        metrics.registry.observe(
+            request.method,
+            metrics.route_label(match.route if match else None),
+            response.status_code, total, stats,
+        )
+        return response
+
+
+class NPlusOneMiddleware:
+    """Ищет N+1 в запросах к API.
+
+    При NPLUSONE_RAISE (так запускаются тесты) найденный N+1 валит
+    запрос. Иначе проверяется доля NPLUSONE_SAMPLE_RATE запросов, и
+    находки пишутся предупреждением в лог с вьюхой и полем сериализатора.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        raise_errors = settings.NPLUSONE_RAISE
+        if (not raise_errors
+                and random.random() >= settings.NPLUSONE_SAMPLE_RATE):
+            return self.get_response(request)
+        detector = Detector()
+        with connection.execute_wrapper(detector):
+            response = self.get_response(request)
+        if detector.problems:
+            match = request.resolver_match
+            view = match.view_name if match else request.path
+            description = detector.describe(f'{request.method} {view}')
+            if raise_errors:
+                raise NPlusOneError(description)
+            logger.warning(description)
+        return response
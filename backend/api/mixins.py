@@ -0,0 +1,96 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.cache import get_modified, get_versions, response_key
+
+
+class CachedResponseMixin:
+    """Кэширует ответы list и retrieve с версиями пространств имён.
+
+    cache_namespaces перечисляет данные, из которых собран ответ: их
+    версии входят в ключ, поэтому после записи в любую из моделей
+    закэшированный ответ просто перестаёт находиться. При
+    cache_anonymous_only ответы авторизованным пользователям не
+    кэшируются, так как содержат их личные флаги.
+    """
+
+    cache_namespaces = ()
+    cache_anonymous_only = False
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request,
+                                    *args, **kwargs)
+
+    def can_cache(self, request):
+        return (settings.RESPONSE_CACHE_TIMEOUT > 0
+                and request.method == 'GET'
+                and not (self.cache_anonymous_only
+                         and request.user.is_authenticated))
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.can_cache(request):
+            return handler(request, *args, **kwargs)
+        key = response_key(self.basename, request.build_absolute_uri(),
+                           self.cache_namespaces)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalGetMixin:
+    """Добавляет ETag и Last-Modified и отвечает 304 на условные GET.
+
+    ETag собирается из адреса запроса и версий cache_namespaces, а
+    Last-Modified — из времени их последнего изменения. И то и другое
+    меняется при каждой записи в эти модели и хранится в общем кэше,
+    так что проверка не ходит в базу.
+    """
+
+    cache_namespaces = ()
+    conditional_anonymous_only = False
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request,
+                                         *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request,
+                                         *args, **kwargs)
+
+    def get_validators(self, request):
+        """Возвращает ETag и Last-Modified (Unix-время)."""
+        etag = quote_etag(hashlib.md5(repr((
+            request.build_absolute_uri(), get_versions(self.cache_namespaces),
+        )).encode()).hexdigest())
+        return etag, get_modified(self.cache_namespaces)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if (request.method != 'GET'
+                or (self.conditional_anonymous_only
+                    and request.user.is_authenticated)):
+            return handler(request, *args, **kwargs)
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
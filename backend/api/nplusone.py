@@ -0,0 +1,86 @@
+"""Поиск N+1: одинаковых SELECT с разными параметрами за один запрос."""
+import logging
+import re
+import sys
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class NPlusOneError(Exception):
+    """Запрос повторяется с разными параметрами больше порога."""
+
+
+def normalize(sql):
+    # Списки IN разной длины — это один и тот же запрос.
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def _params_key(params):
+    try:
+        return hash(tuple(params) if isinstance(params, list) else params)
+    except TypeError:
+        return repr(params)
+
+
+def find_origin():
+    """Ищет в стеке поле сериализатора, из-за которого выполнен запрос."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_name == 'to_representation':
+            instance = frame.f_locals.get('self')
+            field = frame.f_locals.get('field')
+            if (isinstance(instance, serializers.Serializer)
+                    and field is not None):
+                return f'{type(instance).__name__}.{field.field_name}'
+        frame = frame.f_back
+    return None
+
+
+class Detector:
+    """Обёртка выполнения SQL, группирующая SELECT по тексту запроса.
+
+    Запрос попадает в problems, когда выполняется с threshold + 1
+    разными наборами параметров. Поле сериализатора ищется в стеке
+    только в этот момент, поэтому обычные запросы стоят одного поиска
+    в словаре.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or settings.NPLUSONE_THRESHOLD
+        self.statements = {}
+        self.problems = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.startswith('SELECT'):
+            self.record(normalize(sql), params)
+        return execute(sql, params, many, context)
+
+    def record(self, sql, params):
+        seen = self.statements.setdefault(sql, set())
+        seen.add(_params_key(params))
+        if len(seen) == self.threshold + 1:
+            self.problems[sql] = find_origin()
+
+    def describe(self, view=None):
+        lines = [f'N+1 в {view}:' if view else 'N+1:']
+        for sql, origin in self.problems.items():
+            lines.append(f'{len(self.statements[sql])} раз '
+                         f'({origin or "вне сериализатора"}): {sql}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def detect_n_plus_one(threshold=None):
+    """Поднимает NPlusOneError, если в блоке найден N+1."""
+    detector = Detector(threshold)
+    with connection.execute_wrapper(detector):
+        yield detector
+    if detector.problems:
+        raise NPlusOneError(detector.describe())
@@ -1,9 +1,211 @@
+import hashlib
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+
 from django.conf import settings
-from rest_framework.pagination import LimitOffsetPagination
+from django.db.models import QuerySet
+from rest_framework.pagination import LimitOffsetPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(LimitOffsetPagination):
-    """Пагинация для UserViewSet."""
+    """Пагинация по номеру страницы или смещению."""
 
     default_limit = settings.POST_PER_PAGE
     max_limit = 100
+    page_query_param = 'page'
+
+    def get_page_number(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_query_param], strict=True)
+        except (KeyError, ValueError):
+            return None
+
+    def get_offset(self, request):
+        page = self.get_page_number(request)
+        if page is not None:
+            return (page - 1) * self.get_limit(request)
+        return super().get_offset(request)
+
+    def get_page_link(self, page):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.page_query_param, page)
+
+    def get_next_link(self):
+        if self.get_page_number(self.request) is None:
+            return super().get_next_link()
+        if self.offset + self.limit >= self.count:
+            return None
+        return self.get_page_link(self.offset // self.limit + 2)
+
+    def get_previous_link(self):
+        if self.get_page_number(self.request) is None:
+            return super().get_previous_link()
+        if self.offset <= 0:
+            return None
+        return self.get_page_link(self.offset // self.limit)
+
+
+class KeysetPagination(CustomPagination):
+    """Пагинация по ключу с сохранением параметров page и limit.
+
+    Включается параметром cursor (можно пустым). Ссылки next и previous
+    несут курсор с ключом крайней записи, поэтому переход на соседнюю
+    страницу выбирает строки по индексу без OFFSET и без COUNT(*).
+    Без подходящего курсора страница отдаётся через смещение.
+    """
+
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.page = self.get_page_number(request) or 1
+        self.offset = (self.page - 1) * self.limit
+        self.key_field, self.descending = self.get_key(queryset)
+        cursor = self.decode_cursor(request)
+        if cursor is None or self.key_field is None:
+            self.count = self.get_count(queryset)
+            results = list(queryset[self.offset:self.offset + self.limit + 1])
+            self.has_more = len(results) > self.limit
+            self.results = results[:self.limit]
+            self.has_less = self.page > 1
+        else:
+            self.count = cursor['c']
+            backwards = cursor['b']
+            lookup = 'gt' if self.descending == backwards else 'lt'
+            order = self.key_field if lookup == 'gt' else f'-{self.key_field}'
+            results = list(
+                queryset.filter(**{f'{self.key_field}__{lookup}': cursor['k']})
+                .order_by(order)[:self.limit + 1]
+            )
+            extra = len(results) > self.limit
+            results = results[:self.limit]
+            if backwards:
+                results.reverse()
+                self.has_more, self.has_less = True, extra
+            else:
+                self.has_more, self.has_less = extra, True
+            self.results = results
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        return self.results
+
+    def get_key(self, queryset):
+        if not isinstance(queryset, QuerySet):
+            return None, False
+        ordering = (queryset.query.order_by
+                    or queryset.model._meta.ordering or ['pk'])
+        if len(ordering) > 1 or not isinstance(ordering[0], str):
+            return None, False
+        field = ordering[0].lstrip('-')
+        if field not in ('id', 'pk'):
+            return None, False
+        return field, ordering[0].startswith('-')
+
+    def get_filters_digest(self, request):
+        params = sorted(
+            (key, value) for key, value in request.query_params.items()
+            if key not in (self.cursor_query_param, self.page_query_param,
+                           self.offset_query_param)
+        )
+        return hashlib.md5(json.dumps(params).encode()).hexdigest()[:8]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params[self.cursor_query_param]
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')))
+        except (BinasciiError, UnicodeError, ValueError):
+            return None
+        if (not isinstance(cursor, dict) or cursor.get('p') != self.page
+                or not isinstance(cursor.get('k'), int)
+                or not isinstance(cursor.get('c'), int)):
+            return None
+        if cursor.get('f') != self.get_filters_digest(request):
+            return None
+        return cursor
+
+    def encode_cursor(self, page, key=None, backwards=False):
+        if key is None:
+            encoded = ''
+        else:
+            cursor = {'p': page, 'k': key, 'b': backwards, 'c': self.count,
+                      'f': self.get_filters_digest(self.request)}
+            encoded = b64encode(json.dumps(cursor).encode('ascii')).decode()
+        return replace_query_param(self.get_page_link(page),
+                                   self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.cursor_query_param not in self.request.query_params:
+            return super().get_next_link()
+        if not self.has_more or not self.results:
+            return None
+        if self.key_field is None:
+            return self.encode_cursor(self.page + 1)
+        key = getattr(self.results[-1], self.key_field)
+        return self.encode_cursor(self.page + 1, key, False)
+
+    def get_previous_link(self):
+        if self.cursor_query_param not in self.request.query_params:
+            return super().get_previous_link()
+        if not self.has_less or self.page <= 1:
+            return None
+        if self.key_field is None or not self.results:
+            return self.encode_cursor(self.page - 1)
+        key = getattr(self.results[0], self.key_field)
+        return self.encode_cursor(self.page - 1, key, True)
+
+
+class FeedPagination(CustomPagination):
+    """Пагинация ленты подписок по ключу.
+
+    Курсор несёт id последнего рецепта страницы, а следующая страница
+    начинается с рецептов старше него. Общее число рецептов в ленте не
+    считается, поэтому ответ состоит из next и results.
+    """
+
+    cursor_query_param = 'cursor'
+
+    def paginate_feed(self, fetch, queryset, request):
+        """Отдаёт страницу ленты.
+
+        fetch(limit, before) возвращает до limit + 1 id рецептов от
+        новых к старым, а сами рецепты читаются из queryset.
+        """
+        self.request = request
+        self.limit = self.get_limit(request)
+        ids = fetch(self.limit, self.decode_cursor(request))
+        self.has_more = len(ids) > self.limit
+        ids = ids[:self.limit]
+        recipes = queryset.in_bulk(ids)
+        self.results = [recipes[pk] for pk in ids if pk in recipes]
+        return self.results
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            key = json.loads(b64decode(encoded.encode('ascii')))
+        except (BinasciiError, UnicodeError, ValueError):
+            return None
+        return key if isinstance(key, int) else None
+
+    def get_next_link(self):
+        if not self.has_more or not self.results:
+            return None
+        encoded = b64encode(
+            json.dumps(self.results[-1].pk).encode('ascii')).decode()
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param, encoded)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
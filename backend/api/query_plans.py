@@ -0,0 +1,314 @@
+"""Планы выполнения горячих запросов API и советы по индексам.
+
+Запросы из HOT_QUERIES повторяют наборы, которые строят вьюхи, и
+разбираются EXPLAIN на засеянной базе (см. api.benchmarks). Полное
+сканирование и сортировка таблицы, в которой не меньше min_rows строк,
+считаются находками. По столбцам фильтров таких запросов предлагаются
+составные индексы, которых ещё нет в базе.
+"""
+import json
+import os
+import random
+import re
+from collections import defaultdict
+from io import StringIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management import call_command
+from django.db import connection, models
+
+from api import benchmarks
+from recipes.models import (FeedEntry, Ingredient, Recipe,
+                            ShoppingCartIngredient)
+from users.models import Subscription, User
+
+SNAPSHOT_PATH = os.path.join(settings.BASE_DIR, 'data', 'query_plans.json')
+INGREDIENTS_PATH = os.path.join(settings.BASE_DIR, 'data', 'ingredients.json')
+SUPPORTED_VENDORS = ('postgresql', 'sqlite')
+MIN_ROWS = 500
+PAGE = 10
+SEQ_SCAN = 'seq_scan'
+SORT = 'sort'
+EQUALITY_LOOKUPS = {'exact', 'in'}
+RANGE_LOOKUPS = {'gt', 'gte', 'lt', 'lte', 'range', 'isnull'}
+# Поиск подстроки обычный B-tree индекс не ускоряет.
+TEXT_LOOKUPS = {'contains', 'icontains', 'iexact', 'istartswith',
+                'endswith', 'iendswith', 'regex', 'iregex'}
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+def _subscribed(ctx):
+    return list(Subscription.objects.filter(user=ctx['user']).values_list(
+        'subscribing_id', flat=True))
+
+
+HOT_QUERIES = {
+    'recipes.list': lambda ctx: Recipe.objects.select_related(
+        'author').with_user_flags(User(id=ctx['user']))[:PAGE],
+    'recipes.author': lambda ctx: Recipe.objects.filter(
+        author=ctx['subscribed'])[:PAGE],
+    'recipes.tags': lambda ctx: Recipe.objects.filter(
+        tags__slug__in=[f'tag{ctx["tag"]}']).distinct()[:PAGE],
+    'recipes.is_favorited': lambda ctx: Recipe.objects.filter(
+        favorites__user=ctx['user'])[:PAGE],
+    'recipes.is_in_shopping_cart': lambda ctx: Recipe.objects.filter(
+        shoppingcart__user=ctx['user'])[:PAGE],
+    'recipes.popular': lambda ctx: Recipe.objects.filter(
+        popularity__gt=0, tags__slug=f'tag{ctx["tag"]}',
+    ).order_by('-popularity', '-id').values('id')[:PAGE],
+    'recipes.search': lambda ctx: Recipe.objects.search('рецепт')[:PAGE],
+    'users.list': lambda ctx: User.objects.annotate(
+        subscribed=models.Exists(Subscription.objects.filter(
+            user=ctx['user'], subscribing=models.OuterRef('pk'))),
+    ).order_by('id')[:PAGE],
+    'subscriptions.list': lambda ctx: Subscription.objects.select_related(
+        'subscribing').filter(user=ctx['user']).order_by('id')[:PAGE],
+    'subscriptions.recipes': lambda ctx: Recipe.objects.filter(
+        author__in=_subscribed(ctx)).order_by('-author', '-id'),
+    'feed.entries': lambda ctx: FeedEntry.objects.filter(
+        user=ctx['user']).order_by('-recipe_id').values('recipe_id')[:PAGE],
+    'ingredients.name': lambda ctx: Ingredient.objects.filter(
+        name__icontains='сыр'),
+    'shopping_cart.download': lambda ctx: ShoppingCartIngredient.objects
+    .filter(user=ctx['user'])
+    .values('measurement_unit', 'total_amount',
+            name=models.F('ingredient__name'))
+    .order_by('name', 'measurement_unit'),
+}
+
+
+def is_supported():
+    return connection.vendor in SUPPORTED_VENDORS
+
+
+def seed(size):
+    """Засевает базу набором size и собирает статистику планировщика."""
+    ctx = benchmarks.seed(benchmarks.SIZES[size], random.Random(0))
+    call_command('import_ingredients', INGREDIENTS_PATH, stdout=StringIO())
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return ctx
+
+
+def load_snapshots(path=SNAPSHOT_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def table_sizes():
+    """Число строк в таблицах моделей."""
+    sizes = {}
+    with connection.cursor() as cursor:
+        existing = set(connection.introspection.table_names(cursor))
+        for model in apps.get_models(include_auto_created=True):
+            table = model._meta.db_table
+            if table in existing and table not in sizes:
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                sizes[table] = cursor.fetchone()[0]
+    return sizes
+
+
+def _subqueries(query):
+    """Сам запрос и все вложенные в него подзапросы."""
+    yield query
+    children = list(query.annotations.values())
+    nodes = [query.where]
+    while nodes:
+        node = nodes.pop()
+        for child in node.children:
+            if hasattr(child, 'children'):
+                nodes.append(child)
+            else:
+                children.append(child)
+                children.append(getattr(child, 'rhs', None))
+    for child in children:
+        inner = getattr(child, 'query', child)
+        if isinstance(inner, models.sql.Query) and inner is not query:
+            yield from _subqueries(inner)
+
+
+def _lookups(query):
+    """Столбцы, по которым фильтрует запрос: (таблица, столбец, lookup)."""
+    nodes = [query.where]
+    while nodes:
+        node = nodes.pop()
+        for child in node.children:
+            if hasattr(child, 'children'):
+                nodes.append(child)
+                continue
+            lhs = getattr(child, 'lhs', None)
+            join = query.alias_map.get(getattr(lhs, 'alias', None))
+            if join is not None and getattr(lhs, 'target', None):
+                yield join.table_name, lhs.target.column, child.lookup_name
+
+
+def _aliases(query):
+    aliases = {}
+    for inner in _subqueries(query):
+        for alias, join in inner.alias_map.items():
+            aliases.setdefault(alias, join.table_name)
+    return aliases
+
+
+def _postgres_nodes(plan, depth=0):
+    text = plan['Node Type']
+    if 'Relation Name' in plan:
+        text += f' on {plan["Relation Name"]}'
+    if 'Index Name' in plan:
+        text += f' using {plan["Index Name"]}'
+    if 'Sort Key' in plan:
+        text += f' by {", ".join(plan["Sort Key"])}'
+    yield depth, text, plan
+    for child in plan.get('Plans', ()):
+        yield from _postgres_nodes(child, depth + 1)
+
+
+def explain(queryset):
+    """Возвращает план запроса: строки и находки (вид, таблица)."""
+    query = queryset.query
+    sql, params = query.sql_with_params()
+    base = query.get_meta().db_table
+    lines = []
+    findings = []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            for depth, text, node in _postgres_nodes(plan[0]['Plan']):
+                lines.append('  ' * depth + text)
+                if node['Node Type'] == 'Seq Scan':
+                    findings.append((SEQ_SCAN, node['Relation Name']))
+                elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+                    findings.append((SORT, base))
+        else:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            aliases = _aliases(query)
+            depths = {0: -1}
+            for node_id, parent, _, detail in cursor.fetchall():
+                depths[node_id] = depths.get(parent, -1) + 1
+                lines.append('  ' * depths[node_id] + detail)
+                scan = SQLITE_SCAN.match(detail)
+                # Виртуальную таблицу (FTS5) обходит её модуль по индексу
+                # MATCH, это не полное сканирование.
+                if (scan and ' USING ' not in detail
+                        and ' VIRTUAL TABLE ' not in detail):
+                    table = scan.group(1)
+                    findings.append((SEQ_SCAN, aliases.get(table, table)))
+                elif detail.startswith('USE TEMP B-TREE FOR ORDER BY'):
+                    findings.append((SORT, base))
+    return lines, list(dict.fromkeys(findings))
+
+
+def _existing_indexes(table):
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [constraint['columns'] for constraint in constraints.values()
+            if constraint['index'] or constraint['unique']
+            or constraint['primary_key']]
+
+
+def _order_columns(query):
+    opts = query.get_meta()
+    ordering = query.order_by or (
+        opts.ordering if query.default_ordering else ())
+    columns = []
+    for name in ordering:
+        # Индекс поможет сортировке, только если все её поля лежат
+        # в самой таблице.
+        try:
+            field = opts.get_field(str(name).lstrip('-'))
+        except FieldDoesNotExist:
+            return []
+        if not field.concrete:
+            return []
+        columns.append(field.column)
+    return columns
+
+
+def advise(queryset, findings):
+    """Предлагает индексы для находок запроса.
+
+    Возвращает список (модель, models.Index) и список замечаний о
+    таблицах, которым индекс по столбцам не поможет.
+    """
+    query = queryset.query
+    base = query.get_meta().db_table
+    filters = defaultdict(list)
+    for inner in _subqueries(query):
+        for table, column, lookup in _lookups(inner):
+            filters[table].append((column, lookup))
+    models_by_table = {
+        model._meta.db_table: model
+        for model in apps.get_models(include_auto_created=True)
+    }
+    proposals = []
+    notes = []
+    for kind, table in findings:
+        lookups = filters.get(table, [])
+        text = [column for column, lookup in lookups
+                if lookup in TEXT_LOOKUPS]
+        if text:
+            notes.append(f'{table}: поиск подстроки по {", ".join(text)} '
+                         'требует триграммного индекса')
+        columns = [column for column, lookup in lookups
+                   if lookup in EQUALITY_LOOKUPS]
+        columns += [column for column, lookup in lookups
+                    if lookup in RANGE_LOOKUPS][:1]
+        if kind == SORT and table == base and columns:
+            columns += _order_columns(query)
+        columns = list(dict.fromkeys(columns))
+        if not columns or any(existing[:len(columns)] == columns
+                              for existing in _existing_indexes(table)):
+            continue
+        model = models_by_table.get(table)
+        if model is None or model._meta.auto_created:
+            notes.append(f'{table}: нужен индекс по {", ".join(columns)}, '
+                         'но таблица создана Django автоматически')
+            continue
+        fields = {field.column: field.name
+                  for field in model._meta.concrete_fields}
+        index = models.Index(fields=[fields[column] for column in columns])
+        index.set_name_with_model(model)
+        if all((model, index.fields) != (other_model, other.fields)
+               for other_model, other in proposals):
+            proposals.append((model, index))
+    return proposals, notes
+
+
+def run(ctx, sizes, min_rows):
+    """Разбирает все HOT_QUERIES и возвращает отчёт для снимка."""
+    report = {}
+    for name, build in HOT_QUERIES.items():
+        queryset = build(ctx)
+        lines, findings = explain(queryset)
+        large = [(kind, table) for kind, table in findings
+                 if sizes.get(table, 0) >= min_rows]
+        proposals, notes = advise(queryset, large)
+        report[name] = {
+            'plan': lines,
+            'findings': [f'{kind} {table}' for kind, table in large],
+            'proposals': proposals,
+            'notes': notes,
+        }
+    return report
+
+
+def snapshot_failures(report, snapshot):
+    """Находит запросы, у которых появились новые находки."""
+    failures = []
+    for name, entry in report.items():
+        saved = snapshot.get(name)
+        if saved is None:
+            failures.append(f'{name}: нет снимка плана')
+            continue
+        failures += [f'{name}: {finding}, в снимке этого не было'
+                     for finding in entry['findings']
+                     if finding not in saved['findings']]
+    return failures
@@ -0,0 +1,414 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from fractions import Fraction
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.cache import is_process_local
+from recipes.models import Recipe
+
+SEQUENCE_KEY = 'recipe-index:sequence'
+CHANGE_KEY = 'recipe-index:change:{}'
+
+
+def current_sequence():
+    # Счётчик, потерянный кэшем, начинается заново с текущего времени,
+    # поэтому индекс видит разрыв и не пропускает изменения.
+    cache.add(SEQUENCE_KEY, time.time_ns(), timeout=None)
+    return cache.get(SEQUENCE_KEY)
+
+
+def log_change(recipe_id):
+    """Записывает в кэш, что рецепт изменён или удалён.
+
+    Номер изменения берётся из общего счётчика, поэтому процессы видят
+    одну и ту же последовательность и догоняют её по своему номеру.
+    """
+    current_sequence()
+    try:
+        sequence = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        return
+    cache.set(CHANGE_KEY.format(sequence), recipe_id,
+              settings.RECIPE_INDEX_TTL)
+
+
+def index_ttl():
+    # Журнал в кэше процесса не видит изменений из других процессов,
+    # поэтому с ним индекс пересобирается через RECIPE_INDEX_LOCAL_TTL.
+    if is_process_local():
+        return min(settings.RECIPE_INDEX_TTL,
+                   settings.RECIPE_INDEX_LOCAL_TTL)
+    return settings.RECIPE_INDEX_TTL
+
+
+def _remove(ids, value):
+    position = bisect_left(ids, value)
+    if position < len(ids) and ids[position] == value:
+        del ids[position]
+        return position
+    return None
+
+
+def _contains(ids, value):
+    position = bisect_left(ids, value)
+    return position < len(ids) and ids[position] == value
+
+
+def _bitset(ids):
+    """Собирает из id рецептов целое, где бит i означает рецепт i."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for recipe_id in ids:
+        buffer[recipe_id >> 3] |= 1 << (recipe_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _count_bits(bitset):
+    return bin(bitset).count('1')
+
+
+class ChangeLogIndex(ABC):
+    """Индекс рецептов в памяти процесса, который догоняет журнал.
+
+    Индекс строится лениво, догоняет чужие записи по журналу изменений
+    в кэше (log_change) и собирается заново, если журнал потерян,
+    отстал больше чем на RECIPE_INDEX_MAX_LAG или прошло
+    срок index_ttl(). Подклассы задают _build и _apply.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._sequence = 0
+        self._built_at = 0.0
+
+    @abstractmethod
+    def _build(self):
+        """Собирает индекс по базе целиком."""
+
+    @abstractmethod
+    def _apply(self, recipe_ids):
+        """Перечитывает из базы изменённые и удалённые рецепты."""
+
+    def _refresh(self):
+        sequence = current_sequence()
+        if (not self._built or sequence < self._sequence
+                or sequence - self._sequence > settings.RECIPE_INDEX_MAX_LAG
+                or time.monotonic() - self._built_at > index_ttl()):
+            self._build()
+            self._built = True
+            self._sequence = sequence
+            self._built_at = time.monotonic()
+            return
+        if sequence == self._sequence:
+            return
+        keys = [CHANGE_KEY.format(number)
+                for number in range(self._sequence + 1, sequence + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            self._built = False
+            self._refresh()
+            return
+        self._apply(set(changes.values()))
+        self._sequence = sequence
+
+
+class RecipeIndex(ChangeLogIndex):
+    """Индекс рецептов по тэгам и авторам.
+
+    Для каждого тэга и автора хранится отсортированный массив id
+    рецептов, а для удаления — параллельные массивы всех id и их
+    авторов.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._ids = None
+        self._owners = None
+        self._tags = None
+        self._authors = None
+        self._unions = {}
+
+    def _build(self):
+        ids = array('q')
+        owners = array('q')
+        authors = {}
+        rows = Recipe.objects.order_by('id').values_list('id', 'author_id')
+        for recipe_id, author_id in rows.iterator():
+            ids.append(recipe_id)
+            owners.append(author_id)
+            authors.setdefault(author_id, array('q')).append(recipe_id)
+        tags = {}
+        links = Recipe.tags.through.objects.order_by(
+            'tag_id', 'recipe_id').values_list('tag_id', 'recipe_id')
+        for tag_id, recipe_id in links.iterator():
+            tags.setdefault(tag_id, array('q')).append(recipe_id)
+        self._ids, self._owners = ids, owners
+        self._tags, self._authors = tags, authors
+        self._unions = {}
+
+    def _discard(self, recipe_id):
+        position = _remove(self._ids, recipe_id)
+        if position is None:
+            return
+        author_id = self._owners.pop(position)
+        _remove(self._authors.get(author_id, array('q')), recipe_id)
+        for ids in self._tags.values():
+            _remove(ids, recipe_id)
+
+    def _apply(self, recipe_ids):
+        rows = dict(Recipe.objects.filter(id__in=recipe_ids).values_list(
+            'id', 'author_id'))
+        links = Recipe.tags.through.objects.filter(
+            recipe_id__in=rows).values_list('recipe_id', 'tag_id')
+        for recipe_id in recipe_ids:
+            self._discard(recipe_id)
+        for recipe_id, author_id in rows.items():
+            position = bisect_left(self._ids, recipe_id)
+            self._ids.insert(position, recipe_id)
+            self._owners.insert(position, author_id)
+            insort(self._authors.setdefault(author_id, array('q')),
+                   recipe_id)
+        for recipe_id, tag_id in links:
+            insort(self._tags.setdefault(tag_id, array('q')), recipe_id)
+        self._unions = {}
+
+    def _union(self, tag_ids):
+        key = frozenset(tag_ids)
+        union = self._unions.get(key)
+        if union is None:
+            merged = set()
+            for tag_id in key:
+                merged.update(self._tags.get(tag_id, ()))
+            union = self._unions[key] = array(
+                'q', sorted(merged, reverse=True))
+        return union
+
+    def filter(self, tag_ids=(), author_id=None, recipe_ids=None):
+        """Возвращает id рецептов от новых к старым.
+
+        tag_ids объединяются через ИЛИ, как в RecipeFilter; author_id и
+        набор recipe_ids (избранное, список покупок) сужают результат.
+        Проверка начинается с самого короткого списка, а остальные
+        ограничения проверяются бинарным поиском.
+        """
+        with self._lock:
+            self._refresh()
+            sets = []
+            if author_id is not None:
+                sets.append(self._authors.get(author_id, array('q')))
+            if recipe_ids is not None:
+                sets.append(sorted(recipe_ids))
+            if not sets:
+                return self._union(tag_ids) if tag_ids else self._ids[::-1]
+            sets.sort(key=len)
+            tags = [self._tags.get(tag_id, array('q')) for tag_id in tag_ids]
+            return [
+                recipe_id for recipe_id in reversed(sets[0])
+                if all(_contains(ids, recipe_id) for ids in sets[1:])
+                and (not tags or any(_contains(ids, recipe_id)
+                                     for ids in tags))
+            ]
+
+
+class PantryIndex(ChangeLogIndex):
+    """Обратный индекс ингредиент -> рецепты для подбора по продуктам.
+
+    Рецепты частых ингредиентов хранятся битовыми масками (целое, где
+    бит i — рецепт i), редких — отсортированными массивами id, так что
+    каждый список занимает не больше памяти, чем маска. Ещё хранятся
+    маски рецептов по числу ингредиентов и по времени приготовления.
+    Число совпадений считается поразрядным сложением масок, а лучшие
+    рецепты выбираются пересечениями масок, без обхода кандидатов
+    в Python.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._postings = None
+        self._by_size = None
+        self._by_time = None
+        self._sizes = None
+        self._times = None
+
+    def _links(self):
+        return Recipe.ingredients.through.objects.values_list(
+            'recipeingredient__name_id', 'recipe_id')
+
+    def _set_recipe(self, recipe_id, size, cooking_time):
+        missing = recipe_id + 1 - len(self._sizes)
+        if missing > 0:
+            self._sizes.extend(bytes(missing * self._sizes.itemsize))
+            self._times.extend(bytes(missing * self._times.itemsize))
+        self._sizes[recipe_id] = size
+        self._times[recipe_id] = cooking_time
+        if size:
+            bit = 1 << recipe_id
+            self._by_size[size] = self._by_size.get(size, 0) | bit
+            self._by_time[cooking_time] = (
+                self._by_time.get(cooking_time, 0) | bit)
+
+    def _build(self):
+        self._sizes = array('H')
+        self._times = array('I')
+        self._by_size = {}
+        self._by_time = {}
+        postings = {}
+        links = self._links().order_by('recipeingredient__name_id',
+                                       'recipe_id')
+        for ingredient_id, recipe_id in links.iterator():
+            postings.setdefault(ingredient_id, array('q')).append(recipe_id)
+        sizes = Counter()
+        for ids in postings.values():
+            sizes.update(ids)
+        rows = Recipe.objects.values_list('id', 'cooking_time')
+        for recipe_id, cooking_time in rows.iterator():
+            self._set_recipe(recipe_id, sizes[recipe_id], cooking_time)
+        # Маска занимает бит на каждый id, массив — 64 бита на рецепт.
+        dense = len(self._sizes) // 64
+        self._postings = {
+            ingredient_id: _bitset(ids) if len(ids) > dense else ids
+            for ingredient_id, ids in postings.items()
+        }
+
+    def _apply(self, recipe_ids):
+        rows = dict(Recipe.objects.filter(id__in=recipe_ids).values_list(
+            'id', 'cooking_time'))
+        links = list(self._links().filter(recipe_id__in=rows))
+        keep = ~_bitset(recipe_ids)
+        for ingredient_id, ids in self._postings.items():
+            if isinstance(ids, int):
+                self._postings[ingredient_id] = ids & keep
+            else:
+                for recipe_id in recipe_ids:
+                    _remove(ids, recipe_id)
+        for masks in (self._by_size, self._by_time):
+            for key in list(masks):
+                masks[key] &= keep
+                if not masks[key]:
+                    del masks[key]
+        sizes = Counter(recipe_id for _, recipe_id in links)
+        for recipe_id in recipe_ids:
+            if recipe_id < len(self._sizes):
+                self._sizes[recipe_id] = 0
+        for recipe_id, cooking_time in rows.items():
+            self._set_recipe(recipe_id, sizes[recipe_id], cooking_time)
+        for ingredient_id, recipe_id in links:
+            ids = self._postings.setdefault(ingredient_id, array('q'))
+            if isinstance(ids, int):
+                self._postings[ingredient_id] = ids | 1 << recipe_id
+            else:
+                insort(ids, recipe_id)
+
+    def match(self, ingredient_ids, limit):
+        """Подбирает рецепты по продуктам ingredient_ids.
+
+        Рецепты сортируются по доле своих ингредиентов, которые есть
+        среди ingredient_ids, затем по времени приготовления и от новых
+        к старым. Упорядочиваются только первые limit.
+        """
+        with self._lock:
+            self._refresh()
+            masks = [
+                ids if isinstance(ids, int) else _bitset(ids)
+                for ids in (self._postings.get(ingredient_id)
+                            for ingredient_id in set(ingredient_ids))
+                if ids
+            ]
+            # Поразрядные счётчики: бит i в digits[j] — j-й разряд числа
+            # продуктов, которые есть в рецепте i.
+            digits = []
+            matched = 0
+            for mask in masks:
+                matched |= mask
+                position = 0
+                while mask:
+                    if position == len(digits):
+                        digits.append(0)
+                    digits[position], mask = (digits[position] ^ mask,
+                                              digits[position] & mask)
+                    position += 1
+            classes = {}
+            for size in self._by_size:
+                for count in range(1, min(size, len(masks)) + 1):
+                    classes.setdefault(Fraction(count, size), []).append(
+                        (count, size))
+            equal = {}
+            times = sorted(self._by_time)
+            ranked = []
+            for coverage in sorted(classes, reverse=True):
+                candidates = 0
+                for count, size in classes[coverage]:
+                    if count not in equal:
+                        mask = -1
+                        for position, digit in enumerate(digits):
+                            mask &= digit if count >> position & 1 else ~digit
+                        equal[count] = mask if count < 1 << len(digits) else 0
+                    if equal[count]:
+                        candidates |= equal[count] & self._by_size[size]
+                for cooking_time in times:
+                    if not candidates or len(ranked) == limit:
+                        break
+                    found = candidates & self._by_time[cooking_time]
+                    candidates ^= found
+                    while found and len(ranked) < limit:
+                        recipe_id = found.bit_length() - 1
+                        found ^= 1 << recipe_id
+                        ranked.append((recipe_id, coverage))
+                if len(ranked) == limit:
+                    break
+            return PantryMatches(_count_bits(matched), ranked)
+
+
+class PantryMatches:
+    """Первые подобранные рецепты и общее число совпадений."""
+
+    def __init__(self, total, ranked):
+        self.total = total
+        self.ranked = ranked
+        self.coverage = dict(ranked)
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        return [recipe_id for recipe_id, _ in self.ranked[index]]
+
+
+class IndexedRecipes:
+    """Найденные индексом id рецептов в роли набора запросов.
+
+    Пагинатор берёт у него длину и срез, и из базы читаются только
+    рецепты среза.
+    """
+
+    def __init__(self, queryset, ids):
+        self.queryset = queryset
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def count(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        ids = self.ids[index]
+        recipes = self.queryset.in_bulk(list(ids))
+        return [recipes[recipe_id] for recipe_id in ids
+                if recipe_id in recipes]
+
+    def order_by(self, *fields):
+        return IndexedRecipes(self.queryset.order_by(*fields), self.ids)
+
+
+recipe_index = RecipeIndex()
+pantry_index = PantryIndex()
@@ -0,0 +1,84 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+
+from api.cache import get_versions
+from recipes.models import Ingredient
+
+IndexSnapshot = namedtuple('IndexSnapshot',
+                           ['keys', 'entries', 'built_at', 'version'])
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Названия хранятся в отсортированном массиве: совпадения по префиксу
+    находятся бинарным поиском, совпадения по подстроке добираются
+    линейным проходом. Индекс строится лениво и перестраивается после
+    изменения ингредиентов (в том числе в другом процессе, что видно по
+    версии ingredients в кэше) или по истечении INGREDIENT_INDEX_TTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Ключи и записи меняются одним присваиванием кортежа, чтобы поиск
+        # не увидел ключи одной сборки и записи другой.
+        self._index = None
+
+    def invalidate(self):
+        self._index = None
+
+    def _is_stale(self, index, version):
+        return (index is None
+                or index.version != version
+                or time.monotonic() - index.built_at
+                > settings.INGREDIENT_INDEX_TTL)
+
+    def _build(self, version):
+        rows = Ingredient.objects.values_list('id', 'name',
+                                              'measurement_unit')
+        entries = sorted(
+            ({'id': pk, 'name': name, 'measurement_unit': unit}
+             for pk, name, unit in rows),
+            key=lambda entry: entry['name'].casefold(),
+        )
+        keys = [entry['name'].casefold() for entry in entries]
+        return IndexSnapshot(keys, entries, time.monotonic(), version)
+
+    def _snapshot(self):
+        version, = get_versions(['ingredients'])
+        index = self._index
+        if self._is_stale(index, version):
+            with self._lock:
+                index = self._index
+                if self._is_stale(index, version):
+                    index = self._index = self._build(version)
+        return index
+
+    def search(self, query, limit=None):
+        """Возвращает ингредиенты: сначала по префиксу, затем по
+        подстроке."""
+        index = self._snapshot()
+        keys, entries = index.keys, index.entries
+        query = query.casefold()
+        limit = limit or settings.INGREDIENT_SEARCH_LIMIT
+        if not query:
+            return entries[:limit]
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        results = entries[start:min(end, start + limit)]
+        if len(results) < limit:
+            for position, key in enumerate(keys):
+                if query in key and not start <= position < end:
+                    results.append(entries[position])
+                    if len(results) == limit:
+                        break
+        return results
+
+
+ingredient_index = IngredientIndex()
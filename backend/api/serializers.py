@@ -1,24 +1,31 @@
 import base64
 import re
-from typing import Union
+from collections import Counter
+from typing import Optional, Union
 
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.validators import MinValueValidator
-from django.db import transaction
+from django.db import connection, transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import serializers
+from rest_framework.pagination import _positive_int
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.metrics import TimedSerializerMixin
+from recipes import renditions
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingCartIngredient, Tag)
 from users.models import Subscription, User
 
 
 def get_flag_parameter(
         self,
-        obj: Union[Favorite, ShoppingCart, Subscription]
+        obj: Union[Favorite, ShoppingCart, Subscription],
+        annotated: Optional[bool] = None
 ) -> bool:
+    if annotated is not None:
+        return annotated
     request = self.context.get('request')
     if request and request.user.is_authenticated:
         return obj.filter(
@@ -26,21 +33,79 @@ def get_flag_parameter(
     return False
 
 
-def recipe_ingredient_create(self, validated_data):
-    ingredients_data = validated_data.pop('ingredients')
-    recipe_ingredients = []
-    for ingredient_data in ingredients_data:
-        ingredient = ingredient_data.pop('id')
-        amount = ingredient_data.pop('amount')
-        recipe_ingredient = RecipeIngredient(
-            name=ingredient,
-            amount=amount,
-            measurement_unit=ingredient.measurement_unit
-        )
-        recipe_ingredients.append(recipe_ingredient)
-    created_ingredients = RecipeIngredient.objects.bulk_create(
-        recipe_ingredients)
-    return created_ingredients
+def set_recipe_ingredients(recipe, ingredients_data, created=False):
+    """Приводит ингредиенты рецепта к переданному списку.
+
+    Сравнивает новый список с текущим и пачками добавляет, обновляет и
+    удаляет только отличающиеся строки RecipeIngredient. Возвращает
+    изменения количеств {(ингредиент, единица): разница}.
+    """
+    amounts = {item['id']: item['amount'] for item in ingredients_data}
+    current = {} if created else {
+        recipe_ingredient.name_id: recipe_ingredient
+        for recipe_ingredient in recipe.ingredients.all()
+    }
+    new_ids = {ingredient.id for ingredient in amounts}
+    obsolete = [recipe_ingredient for ingredient_id, recipe_ingredient
+                in current.items() if ingredient_id not in new_ids]
+    changed = []
+    new_ingredients = []
+    deltas = Counter()
+    for recipe_ingredient in obsolete:
+        deltas[recipe_ingredient.name_id,
+               recipe_ingredient.measurement_unit] -= recipe_ingredient.amount
+    for ingredient, amount in amounts.items():
+        recipe_ingredient = current.get(ingredient.id)
+        deltas[ingredient.id, ingredient.measurement_unit] += amount
+        if recipe_ingredient is None:
+            new_ingredients.append(RecipeIngredient(
+                name=ingredient,
+                amount=amount,
+                measurement_unit=ingredient.measurement_unit
+            ))
+            continue
+        deltas[ingredient.id,
+               recipe_ingredient.measurement_unit] -= recipe_ingredient.amount
+        if (recipe_ingredient.amount != amount
+                or recipe_ingredient.measurement_unit
+                != ingredient.measurement_unit):
+            recipe_ingredient.amount = amount
+            recipe_ingredient.measurement_unit = ingredient.measurement_unit
+            changed.append(recipe_ingredient)
+    if obsolete:
+        recipe.ingredients.remove(*obsolete)
+        RecipeIngredient.objects.filter(
+            id__in=[item.id for item in obsolete],
+            recipes__isnull=True,
+        ).delete()
+    if changed:
+        RecipeIngredient.objects.bulk_update(
+            changed, ['amount', 'measurement_unit'])
+    if new_ingredients:
+        if connection.features.can_return_rows_from_bulk_insert:
+            new_ingredients = RecipeIngredient.objects.bulk_create(
+                new_ingredients)
+        else:
+            for recipe_ingredient in new_ingredients:
+                recipe_ingredient.save()
+        recipe.ingredients.add(*new_ingredients)
+    return {key: amount for key, amount in deltas.items() if amount}
+
+
+def get_srcset(self, field_file, image_renditions):
+    return renditions.srcset(field_file, image_renditions,
+                             self.context.get('request'))
+
+
+def get_recipes_limit(request):
+    """Читает recipes_limit из строки запроса."""
+    if request is None:
+        return None
+    try:
+        return _positive_int(request.query_params['recipes_limit'],
+                             strict=True)
+    except (KeyError, ValueError):
+        return None
 
 
 class Base64ImageField(serializers.ImageField):
@@ -81,12 +146,13 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор пользователя."""
 
     password = serializers.CharField(write_only=True)
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField()
+    avatar_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -99,10 +165,25 @@ class UserSerializer(serializers.ModelSerializer):
             'password',
             'is_subscribed',
             'avatar',
+            'avatar_srcset',
         )
 
     def get_is_subscribed(self, obj):
-        return get_flag_parameter(self, obj.subscribing)
+        return get_flag_parameter(self, obj.subscribing,
+                                  getattr(obj, 'subscribed', None))
+
+    def get_avatar_srcset(self, obj):
+        return get_srcset(self, obj.avatar, obj.avatar_renditions)
+
+
+class UserAvatarSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Сериализатор аватара."""
+
+    avatar = Base64ImageField(allow_null=True)
+
+    class Meta:
+        model = User
+        fields = ('avatar',)
 
 
 class TokenSerializer(serializers.Serializer):
@@ -114,19 +195,19 @@ class TokenSerializer(serializers.Serializer):
     password = serializers.CharField(required=True)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для ингредиента."""
 
     class Meta:
-        fields = '__all__'
+        fields = ['id', 'name', 'measurement_unit']
         model = Ingredient
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для тэга."""
 
     class Meta:
-        fields = '__all__'
+        fields = ['id', 'name', 'slug']
         model = Tag
 
 
@@ -153,7 +234,7 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         model = RecipeIngredient
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для рецепта."""
 
     author = serializers.SlugRelatedField(
@@ -163,6 +244,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
                                               many=True)
     image = Base64ImageField()
+    image_srcset = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     cooking_time = serializers.IntegerField(
@@ -177,52 +259,50 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_favorited',
             'name',
             'image',
+            'image_srcset',
             'text',
             'cooking_time',
             'is_in_shopping_cart',
         ]
         model = Recipe
 
+    def validate_ingredients(self, value):
+        ingredient_ids = [item['id'].id for item in value]
+        if len(ingredient_ids) != len(set(ingredient_ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты в рецепте не должны повторяться.')
+        return value
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        for ingredient_data in ingredients_data:
-            ingredient = ingredient_data.pop('id')
-            amount = ingredient_data.pop('amount')
-            recipe_ingredient = RecipeIngredient.objects.create(
-                name=ingredient,
-                amount=amount,
-                measurement_unit=ingredient.measurement_unit
-            )
-            recipe.ingredients.add(recipe_ingredient)
+        set_recipe_ingredients(recipe, ingredients_data, created=True)
         recipe.tags.set(tags_data)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients_data = validated_data.pop('ingredients')
-        tags_data = validated_data.pop('tags')
-        ingredients_lst = []
-        for ingredient_data in ingredients_data:
-            ingredient = ingredient_data.pop('id')
-            amount = ingredient_data.pop('amount')
-            recipe_ingredient = RecipeIngredient.objects.create(
-                name=ingredient,
-                amount=amount,
-                measurement_unit=ingredient.measurement_unit
+        ingredients_data = validated_data.pop('ingredients', None)
+        tags_data = validated_data.pop('tags', None)
+        if ingredients_data is not None:
+            deltas = set_recipe_ingredients(instance, ingredients_data)
+            ShoppingCartIngredient.objects.apply_deltas(
+                instance.shoppingcart.values_list('user_id', flat=True),
+                deltas,
             )
-            ingredients_lst.append(recipe_ingredient)
-        instance.ingredients.set(ingredients_lst)
-        instance.tags.set(tags_data)
-        instance.save()
-        changed_instance = super().update(instance, validated_data)
-        return changed_instance
+        if tags_data is not None:
+            instance.tags.set(tags_data)
+        return super().update(instance, validated_data)
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['author'] = UserSerializer(instance.author).data
+        author = instance.author
+        if hasattr(instance, 'author_subscribed'):
+            author.subscribed = instance.author_subscribed
+        representation['author'] = UserSerializer(author,
+                                                  context=self.context).data
         representation['tags'] = TagSerializer(instance.tags.all(),
                                                many=True).data
         representation['ingredients'] = IngredientInRecipeSerializer(
@@ -231,26 +311,37 @@ class RecipeSerializer(serializers.ModelSerializer):
         return representation
 
     def get_is_favorited(self, obj):
-        return get_flag_parameter(self, obj.favorites)
+        return get_flag_parameter(self, obj.favorites,
+                                  getattr(obj, 'favorited', None))
 
     def get_is_in_shopping_cart(self, obj):
-        return get_flag_parameter(self, obj.shoppingcart)
+        return get_flag_parameter(self, obj.shoppingcart,
+                                  getattr(obj, 'in_shopping_cart', None))
+
+    def get_image_srcset(self, obj):
+        return get_srcset(self, obj.image, obj.image_renditions)
 
 
-class RecipeLessFieldsSerializer(serializers.ModelSerializer):
+class RecipeLessFieldsSerializer(TimedSerializerMixin,
+                                 serializers.ModelSerializer):
     """Сериализатор рецепта с меньшим числом полей."""
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         fields = [
             'id',
             'name',
             'image',
+            'image_srcset',
             'cooking_time',
         ]
         model = Recipe
 
+    def get_image_srcset(self, obj):
+        return get_srcset(self, obj.image, obj.image_renditions)
+
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор избранного."""
     user = serializers.SlugRelatedField(
         slug_field='username',
@@ -278,7 +369,8 @@ class FavoriteSerializer(serializers.ModelSerializer):
         return representation
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
     """Сериализатор подписки."""
     user = serializers.SlugRelatedField(
         slug_field='username',
@@ -291,7 +383,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         default=serializers.CurrentUserDefault()
     )
     recipes_count = serializers.ReadOnlyField(
-        source='subscribing.recipes.count',
+        source='subscribing.recipes_count',
     )
 
     class Meta:
@@ -320,26 +412,21 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return attrs
 
     def to_representation(self, instance):
-        representation = UserSerializer(instance.subscribing).data
-        recipes_limit = self.context.get('recipes_limit', None)
-        if recipes_limit:
-            representation['recipes'] = RecipeSerializer(
-                instance.subscribing.recipes.all()[:recipes_limit],
-                many=True
-            ).data
-        else:
-            representation['recipes'] = RecipeLessFieldsSerializer(
-                instance.subscribing.recipes.all(),
-                many=True
-            ).data
-        data = super().to_representation(instance)
-        representation.update(data)
-        representation.pop('user', None)
-        representation.pop('subscribing', None)
+        author = instance.subscribing
+        author.subscribed = True
+        recipes = self.context.get('author_recipes', {}).get(author.id)
+        if recipes is None:
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            recipes = author.recipes.all()[:recipes_limit]
+        representation = UserSerializer(author).data
+        representation['recipes'] = RecipeLessFieldsSerializer(
+            recipes, many=True).data
+        representation['recipes_count'] = author.recipes_count
         return representation
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class ShoppingCartSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
     """Сериализатор списка покупок."""
     user = serializers.SlugRelatedField(
         slug_field='username',
@@ -366,3 +453,15 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         representation = RecipeLessFieldsSerializer(instance.recipe).data
         return representation
+
+
+class ShoppingCartIngredientSerializer(TimedSerializerMixin,
+                                       serializers.ModelSerializer):
+    """Сериализатор суммы ингредиента в списке покупок."""
+    id = serializers.ReadOnlyField(source='ingredient_id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    amount = serializers.ReadOnlyField(source='total_amount')
+
+    class Meta:
+        model = ShoppingCartIngredient
+        fields = ['id', 'name', 'measurement_unit', 'amount']
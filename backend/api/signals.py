@@ -0,0 +1,80 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import forget_token, forget_user
+from api.cache import bump
+from api.recipe_index import log_change
+from api.search import ingredient_index
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+CACHE_NAMESPACES = {
+    Recipe: 'recipes',
+    RecipeIngredient: 'recipes',
+    Tag: 'tags',
+    Ingredient: 'ingredients',
+}
+# Поля автора, которые выводятся в рецептах.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name', 'avatar',
+                 'avatar_renditions')
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+def bump_cache_version(sender, **kwargs):
+    transaction.on_commit(partial(bump, CACHE_NAMESPACES[sender]))
+
+
+# Связи рецепта с тэгами и ингредиентами меняются внутри той же
+# транзакции, что и сохранение рецепта, поэтому отдельный m2m_changed не
+# нужен. Получатели вешаются только на перечисленные модели: лишний
+# получатель сигнала удаления отключил бы быстрое каскадное удаление.
+for model in CACHE_NAMESPACES:
+    post_save.connect(bump_cache_version, sender=model)
+    post_delete.connect(bump_cache_version, sender=model)
+
+
+@receiver(pre_save, sender=User)
+def check_author_fields(instance, update_fields=None, **kwargs):
+    # Правка пользователя без рецептов или полей, которых нет в карточке
+    # рецепта (пароль, last_login), не должна сбрасывать кэш рецептов.
+    instance.author_changed = False
+    if instance.pk is None or not instance.recipes_count:
+        return
+    if update_fields is not None:
+        instance.author_changed = bool(set(update_fields) & set(AUTHOR_FIELDS))
+        return
+    saved = User.objects.filter(pk=instance.pk).values(*AUTHOR_FIELDS).first()
+    instance.author_changed = saved is not None and any(
+        (getattr(instance, field) or None) != (saved[field] or None)
+        for field in AUTHOR_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def bump_authors_version(instance, **kwargs):
+    if getattr(instance, 'author_changed', False):
+        transaction.on_commit(partial(bump, 'authors'))
+
+
+@receiver([post_save, post_delete], sender=Token)
+def forget_cached_token(instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_cached_user(instance, created, **kwargs):
+    # При удалении пользователя токен удаляется каскадом сам.
+    if not created:
+        forget_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def log_recipe_index_change(instance, **kwargs):
+    transaction.on_commit(partial(log_change, instance.pk))
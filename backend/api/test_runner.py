@@ -0,0 +1,15 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class NPlusOneTestRunner(DiscoverRunner):
+    """Запускает тесты так, что N+1 в запросе к API валит тест."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.nplusone_settings = override_settings(NPLUSONE_RAISE=True)
+        self.nplusone_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.nplusone_settings.disable()
+        super().teardown_test_environment(**kwargs)
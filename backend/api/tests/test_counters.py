@@ -0,0 +1,59 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import Favorite, Recipe
+from users.models import Subscription, User
+
+
+class CountersTest(TestCase):
+    """Счётчики на строках следуют за избранным, рецептами и подписками."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            User.objects.create(username=name, email=f'{name}@foodgram.ru')
+            for name in ('author', 'reader'))
+
+    def create_recipe(self):
+        return Recipe.objects.create(author=self.author, name='Рецепт',
+                                     text='Текст', cooking_time=10)
+
+    def counters(self):
+        self.author.refresh_from_db()
+        return self.author.recipes_count, self.author.subscribers_count
+
+    def test_signals_keep_counters(self):
+        recipe = self.create_recipe()
+        self.create_recipe()
+        subscription = Subscription.objects.create(user=self.reader,
+                                                   subscribing=self.author)
+        favorite = Favorite.objects.create(user=self.reader, recipe=recipe)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(self.counters(), (2, 1))
+        favorite.delete()
+        subscription.delete()
+        recipe.delete()
+        self.assertEqual(self.counters(), (1, 0))
+
+    def test_counter_does_not_go_below_zero(self):
+        Subscription.objects.create(user=self.reader, subscribing=self.author)
+        User.objects.filter(pk=self.author.pk).update(subscribers_count=0)
+        Subscription.objects.get(subscribing=self.author).delete()
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_recount_fixes_drift(self):
+        recipe = self.create_recipe()
+        Favorite.objects.create(user=self.reader, recipe=recipe)
+        User.objects.filter(pk=self.author.pk).update(recipes_count=5)
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=0)
+        out = StringIO()
+        call_command('recount_counters', '--dry-run', stdout=out)
+        self.assertIn('Всего расхождений: 2', out.getvalue())
+        self.assertEqual(self.counters(), (5, 0))
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.counters(), (1, 0))
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
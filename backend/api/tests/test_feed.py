@@ -0,0 +1,72 @@
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription, User
+
+
+@override_settings(JOBS_EAGER=True, FEED_FANOUT_LIMIT=1,
+                   FEED_BACKFILL_SIZE=2)
+class FeedTest(APITestCase):
+    """Лента раскладывается по подписчикам и добирает популярных авторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.other, cls.author, cls.star = (
+            User.objects.create(username=name, email=f'{name}@foodgram.ru')
+            for name in ('reader', 'other', 'author', 'star'))
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def publish(self, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(author=author, name='Рецепт',
+                                         text='Текст', cooking_time=10).pk
+
+    def subscribe(self, user, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.create(user=user, subscribing=author)
+
+    def unsubscribe(self, user, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.get(user=user, subscribing=author).delete()
+
+    def entries(self, user):
+        return sorted(FeedEntry.objects.filter(user=user).values_list(
+            'recipe_id', flat=True), reverse=True)
+
+    def feed(self, url='/api/recipes/feed/?limit=2'):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_backfill_and_fan_out(self):
+        old = [self.publish(self.author) for _ in range(3)]
+        self.subscribe(self.reader, self.author)
+        self.assertEqual(self.entries(self.reader), old[:0:-1])
+        new = self.publish(self.author)
+        self.assertEqual(self.entries(self.reader), [new, *old[:0:-1]])
+        self.unsubscribe(self.reader, self.author)
+        self.assertEqual(self.entries(self.reader), [])
+
+    def test_popular_author_is_merged_on_read(self):
+        self.subscribe(self.reader, self.star)
+        self.subscribe(self.other, self.star)
+        self.subscribe(self.reader, self.author)
+        recipes = [self.publish(author) for author in
+                   (self.star, self.author, self.star, self.author)]
+        self.assertEqual(self.entries(self.reader), recipes[3::-2])
+        self.assertEqual(self.feed(), recipes[::-1])
+
+    def test_author_below_limit_is_backfilled(self):
+        self.subscribe(self.reader, self.star)
+        self.subscribe(self.other, self.star)
+        recipe = self.publish(self.star)
+        self.assertEqual(self.entries(self.reader), [])
+        self.unsubscribe(self.other, self.star)
+        self.assertEqual(self.entries(self.reader), [recipe])
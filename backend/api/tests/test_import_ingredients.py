@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import Ingredient
+
+ROWS = [
+    {'name': 'соль', 'measurement_unit': 'г'},
+    {'name': 'мука', 'measurement_unit': 'кг'},
+    {'name': 'молоко', 'measurement_unit': 'мл'},
+]
+
+
+class ImportIngredientsTest(TestCase):
+    """import_ingredients считает только действительно вставленные строки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        Ingredient.objects.create(name='мука', measurement_unit='г')
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            json.dump(ROWS, f, ensure_ascii=False)
+        self.addCleanup(os.remove, self.path)
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command('import_ingredients', self.path, *args, stdout=out)
+        return out.getvalue().splitlines()[-1]
+
+    def test_counts(self):
+        summary = self.run_import('--on-conflict', 'update')
+        self.assertIn('добавлено 1, обновлено 1, пропущено 1', summary)
+        self.assertEqual(
+            Ingredient.objects.get(name='мука').measurement_unit, 'кг')
+
+    def test_conflicting_rows_are_not_counted_as_created(self):
+        # Пустая выборка существующих названий изображает параллельный
+        # импорт, вставивший их между выборкой и вставкой.
+        with mock.patch.object(Ingredient.objects, 'filter',
+                               return_value=Ingredient.objects.none()):
+            summary = self.run_import()
+        self.assertIn('добавлено 1, обновлено 0, пропущено 2', summary)
+        self.assertEqual(Ingredient.objects.count(), 3)
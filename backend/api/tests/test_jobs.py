@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jobs import queue
+from jobs.models import Job
+
+CALLS = []
+
+
+@queue.task('tests.record', max_attempts=2, timeout=30)
+def record(value):
+    CALLS.append(value)
+
+
+@override_settings(JOBS_EAGER=False, JOBS_RETRY_DELAY=10,
+                   JOBS_STALE_GRACE=60)
+class JobQueueTest(TestCase):
+    """Очередь выдаёт задачу одному исполнителю и повторяет неудачные."""
+
+    def setUp(self):
+        CALLS.clear()
+
+    def test_enqueue(self):
+        job = queue.enqueue('tests.record', value=1)
+        self.assertEqual((job.status, job.payload, job.max_attempts,
+                          job.timeout),
+                         (Job.QUEUED, {'value': 1}, 2, 30))
+        with self.assertRaises(ValueError):
+            queue.enqueue('tests.unknown')
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(queue.enqueue('tests.record', value=2))
+            self.assertEqual(CALLS, [])
+        self.assertEqual(CALLS, [2])
+        self.assertFalse(Job.objects.exists())
+
+    def test_claim_gives_each_job_once(self):
+        ready = [queue.enqueue('tests.record', value=n) for n in range(3)]
+        later = queue.enqueue('tests.record', value=3)
+        Job.objects.filter(pk=later.pk).update(
+            run_after=timezone.now() + timedelta(hours=1))
+        first = queue.claim('first', 2)
+        second = queue.claim('second', 5)
+        self.assertEqual([job.pk for job in first + second],
+                         [job.pk for job in ready])
+        self.assertEqual(queue.claim('third', 5), [])
+        job = Job.objects.get(pk=first[0].pk)
+        self.assertEqual((job.status, job.locked_by, job.attempts),
+                         (Job.RUNNING, 'first', 1))
+
+    def test_retry_with_backoff_then_fail(self):
+        queue.enqueue('tests.record', value=1)
+        job, = queue.claim('worker', 1)
+        before = timezone.now()
+        queue.fail(job, 'boom')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_error), (Job.QUEUED, 'boom'))
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=10))
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job, = queue.claim('worker', 1)
+        self.assertEqual(job.attempts, 2)
+        queue.fail(job, 'boom again')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_finish_ignores_jobs_taken_by_another_worker(self):
+        queue.enqueue('tests.record', value=1)
+        job, = queue.claim('old', 1)
+        Job.objects.filter(pk=job.pk).update(locked_by='new')
+        queue.finish(job)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.RUNNING)
+
+    def test_release_stale(self):
+        queue.enqueue('tests.record', value=1)
+        job, = queue.claim('lost', 1)
+        self.assertEqual(queue.release_stale(), 0)
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(seconds=30 + 60 + 1))
+        self.assertEqual(queue.release_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('lost', job.last_error)
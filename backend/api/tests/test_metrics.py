@@ -0,0 +1,20 @@
+from django.test import TestCase, override_settings
+
+URL = '/api/_metrics'
+
+
+class MetricsViewTest(TestCase):
+    """Метрики отдаются только по токену из METRICS_TOKEN."""
+
+    @override_settings(METRICS_TOKEN='')
+    def test_hidden_without_token_setting(self):
+        self.assertEqual(self.client.get(URL).status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_token(self):
+        self.assertEqual(self.client.get(URL).status_code, 403)
+        self.assertEqual(self.client.get(
+            URL, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get(URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
@@ -0,0 +1,96 @@
+import random
+
+from django.conf import settings
+from django.test import TestCase
+from rest_framework.test import APITestCase
+
+from api import benchmarks
+from api.nplusone import NPlusOneError, detect_n_plus_one
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+# Строк на странице должно быть больше порога NPLUSONE_THRESHOLD,
+# иначе запрос на каждую строку не отличить от обычных.
+ROWS = 10
+
+
+class DetectNPlusOneTest(TestCase):
+    """detect_n_plus_one различает N+1 и повторы одного запроса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_ids = [
+            User.objects.create(username=f'user{number}',
+                                email=f'user{number}@foodgram.ru').pk
+            for number in range(4)
+        ]
+
+    def test_raises_on_query_per_row(self):
+        with self.assertRaises(NPlusOneError):
+            with detect_n_plus_one(threshold=2):
+                for pk in self.user_ids:
+                    User.objects.filter(pk=pk).first()
+
+    def test_same_parameters_are_not_n_plus_one(self):
+        with detect_n_plus_one(threshold=2) as detector:
+            for _ in self.user_ids:
+                User.objects.filter(pk=self.user_ids[0]).first()
+        self.assertEqual(detector.problems, {})
+
+    def test_in_lists_of_any_length_are_one_query(self):
+        with detect_n_plus_one(threshold=2) as detector:
+            list(User.objects.filter(pk__in=self.user_ids[:1]))
+            list(User.objects.filter(pk__in=self.user_ids))
+        self.assertEqual(len(detector.statements), 1)
+        self.assertEqual(detector.problems, {})
+
+
+class ApiNPlusOneTest(APITestCase):
+    """Списки API не делают запрос на каждую запись.
+
+    Тестовый раннер включает NPLUSONE_RAISE, поэтому N+1 в любом
+    запросе поднимает NPlusOneError прямо из клиента.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ctx = benchmarks.seed(benchmarks.SIZES['small'],
+                                  random.Random(0))
+        user = User.objects.get(pk=cls.ctx['user'])
+        for author in User.objects.exclude(pk=user.pk).exclude(
+                subscribing__user=user)[:ROWS]:
+            Subscription.objects.create(user=user, subscribing=author)
+        for recipe in Recipe.objects.exclude(favorites__user=user)[:ROWS]:
+            Favorite.objects.create(user=user, recipe=recipe)
+        for recipe in Recipe.objects.exclude(
+                shoppingcart__user=user)[:ROWS]:
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.get(pk=self.ctx['user']))
+
+    def test_runner_raises_on_n_plus_one(self):
+        self.assertTrue(settings.NPLUSONE_RAISE)
+
+    def test_recipe_lists(self):
+        for url in (
+            '/api/recipes/?limit=20',
+            '/api/recipes/?limit=20&is_favorited=1',
+            '/api/recipes/?limit=20&is_in_shopping_cart=1',
+            f'/api/recipes/?limit=20&tags={self.ctx["tag_slug"]}',
+            f'/api/recipes/?limit=20&author={self.ctx["subscribed"]}',
+            '/api/recipes/feed/?limit=20',
+            '/api/recipes/popular/?limit=20',
+            f'/api/recipes/{self.ctx["recipe"]}/',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_user_and_subscription_lists(self):
+        for url in (
+            '/api/users/?limit=20',
+            '/api/users/subscriptions/?limit=20',
+            '/api/users/subscriptions/?limit=20&recipes_limit=2',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class KeysetPaginationTest(APITestCase):
+    """Пагинация по курсору листает те же страницы, что и по смещению."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author',
+                                     email='author@foodgram.ru')
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        cls.ids = []
+        cls.tagged = []
+        for number in range(5):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10)
+            if number % 2:
+                recipe.tags.add(cls.tag)
+                cls.tagged.insert(0, recipe.pk)
+            cls.ids.insert(0, recipe.pk)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids_of(self, data):
+        return [item['id'] for item in data['results']]
+
+    def test_walks_pages_forward_and_back(self):
+        pages = []
+        data = self.get('/api/recipes/?limit=2&cursor=')
+        while True:
+            pages.append(self.ids_of(data))
+            self.assertEqual(data['count'], 5)
+            if data['next'] is None:
+                break
+            data = self.get(data['next'])
+        self.assertEqual(pages, [self.ids[:2], self.ids[2:4], self.ids[4:]])
+        data = self.get(data['previous'])
+        self.assertEqual(self.ids_of(data), self.ids[2:4])
+        data = self.get(data['previous'])
+        self.assertEqual(self.ids_of(data), self.ids[:2])
+        self.assertIsNone(data['previous'])
+
+    def test_next_page_skips_offset_and_count(self):
+        data = self.get('/api/recipes/?limit=2&cursor=')
+        with CaptureQueriesContext(connection) as queries:
+            self.get(data['next'])
+        sql = ' '.join(query['sql'] for query in queries).upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_cursor_is_bound_to_filters(self):
+        data = self.get('/api/recipes/?limit=1&cursor=')
+        url = data['next'].replace('limit=1', 'limit=1&tags=lunch')
+        # Курсор от другого набора фильтров не подходит, и страница
+        # отдаётся через смещение.
+        self.assertEqual(self.ids_of(self.get(url)), self.tagged[1:2])
+
+    def test_broken_cursor_falls_back_to_offset(self):
+        data = self.get('/api/recipes/?limit=2&page=2&cursor=garbage')
+        self.assertEqual(self.ids_of(data), self.ids[2:4])
@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.models import User
+
+
+class PantryTest(APITestCase):
+    """Подбор рецептов по продуктам догоняет новые рецепты."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author',
+                                         email='author@foodgram.ru')
+        cls.salt, cls.flour, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'мука', 'молоко'))
+        cls.pancake = cls.create_recipe(10, cls.salt, cls.flour)
+        cls.soup = cls.create_recipe(20, cls.salt)
+        cls.pie = cls.create_recipe(5, cls.salt, cls.flour, cls.milk)
+
+    @classmethod
+    def create_recipe(cls, cooking_time, *ingredients):
+        recipe = Recipe.objects.create(
+            author=cls.author, name=f'Рецепт {cooking_time}', text='Текст',
+            cooking_time=cooking_time)
+        recipe.ingredients.set(
+            RecipeIngredient.objects.create(
+                name=ingredient, amount=1, measurement_unit='г')
+            for ingredient in ingredients)
+        return recipe
+
+    def setUp(self):
+        # Новый счётчик журнала заставляет индекс собраться по этой базе.
+        cache.clear()
+        self.url = (f'/api/recipes/pantry/?ingredients='
+                    f'{self.salt.pk},{self.flour.pk}')
+
+    def get_ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']], response
+
+    def test_ranking_includes_new_recipe(self):
+        ids, _ = self.get_ids(self.url)
+        self.assertEqual(ids, [self.pancake.pk, self.soup.pk, self.pie.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            omelette = self.create_recipe(1, self.salt)
+        ids, response = self.get_ids(self.url)
+        self.assertEqual(
+            ids, [omelette.pk, self.pancake.pk, self.soup.pk, self.pie.pk])
+        self.assertEqual(
+            [item['coverage'] for item in response.data['results']],
+            [1.0, 1.0, 1.0, 0.667])
+
+    def test_cursor_page_has_next_link(self):
+        ids, response = self.get_ids(f'{self.url}&limit=2&cursor=')
+        self.assertEqual(ids, [self.pancake.pk, self.soup.pk])
+        self.assertIsNotNone(response.data['next'])
+        ids, response = self.get_ids(response.data['next'])
+        self.assertEqual(ids, [self.pie.pk])
+        self.assertIsNone(response.data['next'])
@@ -0,0 +1,97 @@
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from recipes import popularity
+from recipes.models import Favorite, PopularityEpoch, Recipe, ShoppingCart, Tag
+from users.models import User
+
+HALF_LIFE = 100
+
+
+def moment(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+@override_settings(POPULARITY_HALF_LIFE=HALF_LIFE,
+                   POPULARITY_FAVORITE_WEIGHT=2, POPULARITY_CART_WEIGHT=1)
+class PopularityTest(TestCase):
+    """Очки популярности затухают и переносятся в новую эпоху."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user',
+                                       email='user@foodgram.ru')
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.old, cls.new = (
+            Recipe.objects.create(author=cls.user, name=name, text='Текст',
+                                  cooking_time=10)
+            for name in ('Старый', 'Новый'))
+        cls.new.tags.add(cls.tag)
+
+    def setUp(self):
+        cache.clear()
+
+    def start_epoch(self, started):
+        PopularityEpoch.objects.update_or_create(
+            pk=popularity.EPOCH_ID, defaults={'started': started})
+
+    def score(self, recipe):
+        recipe.refresh_from_db(fields=['popularity'])
+        return recipe.popularity
+
+    def test_later_additions_weigh_more(self):
+        self.start_epoch(0)
+        popularity.change(self.old.pk, 1, moment(0))
+        popularity.change(self.new.pk, 1, moment(HALF_LIFE))
+        self.assertAlmostEqual(self.score(self.old), 1)
+        self.assertAlmostEqual(self.score(self.new), 2)
+        popularity.change(self.new.pk, -1, moment(HALF_LIFE))
+        self.assertAlmostEqual(self.score(self.new), 0)
+
+    def test_epoch_starts_at_first_change(self):
+        PopularityEpoch.objects.all().delete()
+        popularity.change(self.old.pk, 3, moment(HALF_LIFE))
+        self.assertAlmostEqual(self.score(self.old), 3)
+
+    def test_rebase_keeps_order(self):
+        self.start_epoch(0)
+        popularity.change(self.old.pk, 4, moment(0))
+        popularity.change(self.new.pk, 2, moment(HALF_LIFE))
+        self.assertEqual(popularity.rebase(now=2 * HALF_LIFE), 2)
+        self.assertAlmostEqual(self.score(self.old), 1)
+        self.assertAlmostEqual(self.score(self.new), 1)
+        self.assertEqual(
+            PopularityEpoch.objects.get(pk=popularity.EPOCH_ID).started,
+            2 * HALF_LIFE)
+        popularity.change(self.new.pk, 1, moment(2 * HALF_LIFE))
+        self.assertAlmostEqual(self.score(self.new), 2)
+
+    def test_recompute_matches_incremental_scores(self):
+        self.start_epoch(datetime.now().timestamp())
+        Favorite.objects.create(user=self.user, recipe=self.old)
+        ShoppingCart.objects.create(user=self.user, recipe=self.new)
+        now = datetime.now().timestamp()
+        popularity.rebase(now=now)
+        scores = [self.score(self.old), self.score(self.new)]
+        self.assertEqual(popularity.recompute(now=now), 2)
+        self.assertAlmostEqual(self.score(self.old), scores[0], places=4)
+        self.assertAlmostEqual(self.score(self.new), scores[1], places=4)
+        self.assertAlmostEqual(self.score(self.old), 2, places=2)
+
+    def test_top_is_cached_until_reset(self):
+        Recipe.objects.filter(pk=self.new.pk).update(popularity=1)
+        self.assertEqual(popularity.top('breakfast'), [self.new.pk])
+        Recipe.objects.filter(pk=self.old.pk).update(popularity=2)
+        self.old.tags.add(self.tag)
+        self.assertEqual(popularity.top('breakfast'), [self.new.pk])
+        popularity.reset_top()
+        self.assertEqual(popularity.top('breakfast'),
+                         [self.old.pk, self.new.pk])
+
+    def test_unknown_tag_is_not_cached(self):
+        tag = 'нет такого тэга ' * 20
+        self.assertNotIn(tag, popularity.top_key(tag))
+        self.assertEqual(popularity.top(tag), [])
+        self.assertIsNone(cache.get(popularity.top_key(tag)))
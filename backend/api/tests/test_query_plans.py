@@ -0,0 +1,25 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from api import query_plans
+
+
+@skipUnless(query_plans.is_supported(), 'EXPLAIN не поддерживается')
+class QueryPlanSnapshotTest(TestCase):
+    """Планы горячих запросов не хуже сохранённых в снимке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ctx = query_plans.seed('medium')
+
+    def test_no_plan_regressions(self):
+        snapshot = query_plans.load_snapshots().get(connection.vendor)
+        self.assertIsNotNone(
+            snapshot, f'Нет снимка планов для {connection.vendor}, '
+            'запишите его: explain_queries --update-snapshot')
+        report = query_plans.run(self.ctx, query_plans.table_sizes(),
+                                 query_plans.MIN_ROWS)
+        self.assertEqual(
+            query_plans.snapshot_failures(report, snapshot), [])
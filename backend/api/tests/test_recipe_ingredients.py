@@ -0,0 +1,72 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from api.serializers import set_recipe_ingredients
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.models import User
+
+
+class SetRecipeIngredientsTest(TestCase):
+    """set_recipe_ingredients меняет только отличающиеся строки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author',
+                                         email='author@foodgram.ru')
+        cls.salt, cls.flour, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (('соль', 'г'), ('мука', 'г'),
+                               ('молоко', 'мл')))
+
+    def setUp(self):
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Блины', text='Текст', cooking_time=30)
+        self.deltas = set_recipe_ingredients(self.recipe, [
+            {'id': self.salt, 'amount': 5},
+            {'id': self.flour, 'amount': 200},
+        ], created=True)
+
+    def rows(self):
+        return {row.name_id: row for row in self.recipe.ingredients.all()}
+
+    def test_create_returns_all_amounts(self):
+        self.assertEqual(self.deltas, {(self.salt.pk, 'г'): 5,
+                                       (self.flour.pk, 'г'): 200})
+        self.assertEqual({pk: row.amount for pk, row in self.rows().items()},
+                         {self.salt.pk: 5, self.flour.pk: 200})
+
+    def test_update_touches_only_differences(self):
+        before = self.rows()
+        deltas = set_recipe_ingredients(self.recipe, [
+            {'id': self.salt, 'amount': 5},
+            {'id': self.flour, 'amount': 250},
+            {'id': self.milk, 'amount': 300},
+        ])
+        self.assertEqual(deltas, {(self.flour.pk, 'г'): 50,
+                                  (self.milk.pk, 'мл'): 300})
+        after = self.rows()
+        self.assertEqual(after[self.salt.pk].pk, before[self.salt.pk].pk)
+        self.assertEqual(after[self.flour.pk].pk, before[self.flour.pk].pk)
+        self.assertEqual(after[self.flour.pk].amount, 250)
+        self.assertEqual(after[self.milk.pk].amount, 300)
+
+    def test_removed_rows_are_deleted(self):
+        salt_row = self.rows()[self.salt.pk]
+        deltas = set_recipe_ingredients(self.recipe, [
+            {'id': self.flour, 'amount': 200},
+        ])
+        self.assertEqual(deltas, {(self.salt.pk, 'г'): -5})
+        self.assertEqual(list(self.rows()), [self.flour.pk])
+        self.assertFalse(
+            RecipeIngredient.objects.filter(pk=salt_row.pk).exists())
+
+    def test_same_list_writes_nothing(self):
+        with CaptureQueriesContext(connection) as queries:
+            deltas = set_recipe_ingredients(self.recipe, [
+                {'id': self.flour, 'amount': 200},
+                {'id': self.salt, 'amount': 5},
+            ])
+        self.assertEqual(deltas, {})
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]['sql'].startswith('SELECT'))
@@ -0,0 +1,40 @@
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.models import User
+
+
+class RecipeSearchTest(APITestCase):
+    """Поиск рецептов находит слова и ставит выше совпадения в названии."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author',
+                                     email='author@foodgram.ru')
+        beet = Ingredient.objects.create(name='свекла', measurement_unit='г')
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.borscht = Recipe.objects.create(
+                author=author, name='Борщ', text='Суп с капустой',
+                cooking_time=60)
+            cls.salad = Recipe.objects.create(
+                author=author, name='Винегрет', text='Лучше, чем борщ',
+                cooking_time=20)
+            cls.salad.ingredients.add(RecipeIngredient.objects.create(
+                name=beet, amount=1, measurement_unit='г'))
+            Recipe.objects.create(author=author, name='Омлет',
+                                  text='Яйца и молоко', cooking_time=10)
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_name_match_ranks_first(self):
+        self.assertEqual(self.search('борщ'),
+                         [self.borscht.pk, self.salad.pk])
+
+    def test_finds_by_ingredient(self):
+        self.assertEqual(self.search('свекла'), [self.salad.pk])
+
+    def test_no_match(self):
+        self.assertEqual(self.search('пицца'), [])
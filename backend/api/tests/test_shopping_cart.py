@@ -0,0 +1,101 @@
+from django.test import TestCase
+from rest_framework.test import APITestCase
+
+from api.serializers import set_recipe_ingredients
+from recipes.models import (Ingredient, Recipe, ShoppingCart,
+                            ShoppingCartIngredient)
+from users.models import User
+
+
+def totals(user):
+    return {
+        (ingredient, unit): amount for ingredient, unit, amount in
+        ShoppingCartIngredient.objects.filter(user=user).values_list(
+            'ingredient_id', 'measurement_unit', 'total_amount')
+    }
+
+
+class ApplyDeltasTest(TestCase):
+    """apply_deltas сдвигает суммы и убирает обнулившиеся строки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create(username=f'user{number}',
+                                email=f'user{number}@foodgram.ru')
+            for number in range(2)
+        ]
+        cls.salt, cls.flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'мука'))
+
+    def test_adds_and_subtracts_for_every_user(self):
+        manager = ShoppingCartIngredient.objects
+        user_ids = [user.pk for user in self.users]
+        salt, flour = (self.salt.pk, 'г'), (self.flour.pk, 'г')
+        manager.apply_deltas(user_ids, {salt: 5, flour: 100})
+        manager.apply_deltas(user_ids, {salt: 3, flour: -100})
+        for user in self.users:
+            self.assertEqual(totals(user), {salt: 8})
+        manager.apply_deltas(user_ids[:1], {salt: -8})
+        self.assertEqual(totals(self.users[0]), {})
+        self.assertEqual(totals(self.users[1]), {salt: 8})
+
+    def test_empty_deltas_do_nothing(self):
+        with self.assertNumQueries(0):
+            ShoppingCartIngredient.objects.apply_deltas(
+                [self.users[0].pk], {(self.salt.pk, 'г'): 0})
+            ShoppingCartIngredient.objects.apply_deltas([], {
+                (self.salt.pk, 'г'): 1})
+
+
+class ShoppingCartTotalsTest(APITestCase):
+    """Суммы списка покупок следуют за корзиной и рецептами в ней."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user',
+                                       email='user@foodgram.ru')
+        cls.salt, cls.flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'мука'))
+        cls.pancakes = cls.create_recipe({cls.salt: 5, cls.flour: 200})
+        cls.bread = cls.create_recipe({cls.salt: 10, cls.flour: 500})
+
+    @classmethod
+    def create_recipe(cls, amounts):
+        recipe = Recipe.objects.create(author=cls.user, name='Рецепт',
+                                       text='Текст', cooking_time=30)
+        set_recipe_ingredients(recipe, [
+            {'id': ingredient, 'amount': amount}
+            for ingredient, amount in amounts.items()
+        ], created=True)
+        return recipe
+
+    def assertTotals(self, expected):
+        self.assertEqual(totals(self.user), expected)
+        self.assertEqual(
+            ShoppingCartIngredient.objects.expected_totals([self.user.pk]),
+            {(self.user.pk, *key): amount
+             for key, amount in expected.items()})
+
+    def test_cart_changes_update_totals(self):
+        salt, flour = (self.salt.pk, 'г'), (self.flour.pk, 'г')
+        ShoppingCart.objects.create(user=self.user, recipe=self.pancakes)
+        ShoppingCart.objects.create(user=self.user, recipe=self.bread)
+        self.assertTotals({salt: 15, flour: 700})
+        ShoppingCart.objects.get(user=self.user, recipe=self.bread).delete()
+        self.assertTotals({salt: 5, flour: 200})
+        ShoppingCart.objects.get(user=self.user,
+                                 recipe=self.pancakes).delete()
+        self.assertTotals({})
+
+    def test_recipe_edit_updates_totals(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.pancakes)
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(
+            f'/api/recipes/{self.pancakes.pk}/',
+            {'ingredients': [{'id': self.salt.pk, 'amount': 7}]},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTotals({(self.salt.pk, 'г'): 7})
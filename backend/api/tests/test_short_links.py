@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+
+from recipes import short_links
+from recipes.models import Recipe
+from users.models import User
+
+
+class ShortLinkCodeTest(SimpleTestCase):
+    """Коды коротких ссылок однозначно переводятся обратно в id."""
+
+    def test_round_trip(self):
+        ids = [1, 2, 3, 61, 62, 1000, 10 ** 6, short_links.SPACE - 1]
+        codes = [short_links.encode(recipe_id) for recipe_id in ids]
+        self.assertEqual(len(set(codes)), len(ids))
+        for recipe_id, code in zip(ids, codes):
+            self.assertEqual(len(code), settings.SHORT_LINK_LENGTH)
+            self.assertEqual(short_links.decode(code), recipe_id)
+
+    def test_foreign_codes(self):
+        self.assertIsNone(short_links.decode('abc'))
+        self.assertIsNone(short_links.decode('abc-de'))
+        with self.assertRaises(ValueError):
+            short_links.encode(0)
+
+
+class ShortLinkViewTest(TestCase):
+    """Ссылка из get-link ведёт на страницу рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='author',
+                                     email='author@foodgram.ru')
+        cls.recipe, cls.legacy = (
+            Recipe.objects.create(author=author, name='Рецепт', text='Текст',
+                                  cooking_time=10, short_link=short_link)
+            for short_link in (None, 'aB3d'))
+
+    def setUp(self):
+        short_links.resolve.cache_clear()
+
+    def get_code(self, recipe):
+        response = self.client.get(f'/api/recipes/{recipe.pk}/get-link/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['short-link'].rstrip('/').rsplit('/', 1)[1]
+
+    def assertRedirectsTo(self, code, recipe):
+        response = self.client.get(f'/api/{code}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].endswith(
+            f'/recipes/{recipe.pk}/'))
+
+    def test_new_and_legacy_codes_redirect(self):
+        code = self.get_code(self.recipe)
+        self.assertEqual(code, short_links.encode(self.recipe.pk))
+        self.assertRedirectsTo(code, self.recipe)
+        self.assertEqual(self.get_code(self.legacy), 'aB3d')
+        self.assertRedirectsTo('aB3d', self.legacy)
+
+    def test_unknown_and_deleted_recipes(self):
+        self.assertEqual(
+            self.client.get('/api/recipes/0/get-link/').status_code, 404)
+        self.assertEqual(self.client.get('/api/zzzz/').status_code, 404)
+        code = short_links.encode(self.recipe.pk)
+        self.assertRedirectsTo(code, self.recipe)
+        self.recipe.delete()
+        self.assertEqual(self.client.get(f'/api/{code}/').status_code, 404)
@@ -0,0 +1,61 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe
+from users.models import Subscription, User
+
+URL = '/api/users/subscriptions/'
+
+
+class SubscriptionListTest(APITestCase):
+    """Страница подписок отдаёт свежие рецепты авторов без N+1."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.other = (
+            User.objects.create(username=name, email=f'{name}@foodgram.ru')
+            for name in ('reader', 'other'))
+        cls.authors = []
+        cls.recipes = {}
+        for number in range(4):
+            author = User.objects.create(
+                username=f'author{number}',
+                email=f'author{number}@foodgram.ru')
+            cls.authors.append(author)
+            cls.recipes[author.pk] = [
+                Recipe.objects.create(author=author, name=f'Рецепт {index}',
+                                      text='Текст', cooking_time=10).pk
+                for index in range(number + 1)
+            ][::-1]
+        for author in cls.authors[:3]:
+            Subscription.objects.create(user=cls.reader, subscribing=author)
+        Subscription.objects.create(user=cls.other,
+                                    subscribing=cls.authors[3])
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_lists_own_subscriptions_with_recipes(self):
+        results = self.get(f'{URL}?recipes_limit=2')
+        self.assertEqual([item['id'] for item in results],
+                         [author.pk for author in self.authors[:3]])
+        for item in results:
+            self.assertTrue(item['is_subscribed'])
+            self.assertEqual(item['recipes_count'],
+                             len(self.recipes[item['id']]))
+            self.assertEqual([recipe['id'] for recipe in item['recipes']],
+                             self.recipes[item['id']][:2])
+
+    def test_query_count_does_not_grow_with_authors(self):
+        counts = []
+        for limit in (1, 3):
+            with CaptureQueriesContext(connection) as queries:
+                self.get(f'{URL}?limit={limit}&recipes_limit=2')
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
@@ -5,6 +5,7 @@ from api.views import (
     FavoriteViewSet,
     IngredientViewSet,
     Logout,
+    MetricsView,
     RecipeGetLinkView,
     RecipeViewSet,
     ShoppingCartViewSet,
@@ -59,8 +60,21 @@ urlpatterns = [
     ),
     path('recipes/download_shopping_cart/',
          ShoppingCartViewSet.as_view({'get': 'download_txt'})),
+    path('recipes/shopping_cart_summary/',
+         ShoppingCartViewSet.as_view({'get': 'summary'}),
+         name='shopping_cart_summary'),
+    path('recipes/feed/',
+         RecipeViewSet.as_view({'get': 'feed'}),
+         name='feed'),
+    path('recipes/popular/',
+         RecipeViewSet.as_view({'get': 'popular'}),
+         name='popular'),
+    path('recipes/pantry/',
+         RecipeViewSet.as_view({'get': 'pantry'}),
+         name='pantry'),
     path('recipes/<int:recipe_id>/get-link/',
          RecipeGetLinkView.as_view(), name='short-link'),
+    path('_metrics', MetricsView.as_view(), name='metrics'),
     path('', include(router_v1.urls)),
     path('<str:short_link>/',
          RedirectShortLinkView.as_view()),
@@ -1,7 +1,98 @@
-def create_file_shopping_cart(ingredients):
-    content = 'Shopping_cart\n'
+import csv
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+SHOPPING_CART_TITLE = 'Shopping_cart'
+PDF_FONT_NAME = 'ShoppingCartFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+CHUNK_SIZE = 64 * 1024
+
+
+def shopping_cart_line(ingredient):
+    return (f"{ingredient['name']} "
+            f"({ingredient['measurement_unit']}) - "
+            f"{ingredient['total_amount']}")
+
+
+def shopping_cart_txt(ingredients):
+    yield SHOPPING_CART_TITLE + '\n'
     for ingredient in ingredients:
-        ingredient_data = f"{ingredient['name__name']} \
-({ingredient['measurement_unit']}) - {ingredient['total_amount']}"
-        content += ingredient_data + '\n'
-    return content
+        yield shopping_cart_line(ingredient) + '\n'
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(['name', 'measurement_unit', 'amount'])
+    for ingredient in ingredients:
+        yield writer.writerow([ingredient['name'],
+                               ingredient['measurement_unit'],
+                               ingredient['total_amount']])
+
+
+def get_pdf_font():
+    """Регистрирует шрифт с кириллицей из SHOPPING_CART_PDF_FONT.
+
+    Встроенные шрифты reportlab не содержат кириллицы и рисуют вместо
+    названий квадраты, поэтому без файла шрифта PDF не строится.
+    """
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    if not os.path.exists(settings.SHOPPING_CART_PDF_FONT):
+        raise ImproperlyConfigured(
+            f'Нет шрифта для PDF: {settings.SHOPPING_CART_PDF_FONT}. '
+            'Установите fonts-dejavu-core или укажите TTF-файл с '
+            'кириллицей в SHOPPING_CART_PDF_FONT.')
+    pdfmetrics.registerFont(
+        TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT))
+    return PDF_FONT_NAME
+
+
+def shopping_cart_pdf(ingredients):
+    """Рисует PDF постранично и отдаёт его кусками.
+
+    Шрифт проверяется сразу, до начала ответа. reportlab собирает
+    документ целиком перед записью, поэтому результат пишется во
+    временный файл, который при большом размере уходит на диск, а строки
+    корзины читаются из базы курсором.
+    """
+    return _render_pdf(ingredients, get_pdf_font())
+
+
+def _render_pdf(ingredients, font):
+    with SpooledTemporaryFile(max_size=CHUNK_SIZE * 16) as buffer:
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        y = height - PDF_MARGIN
+        pdf.setFont(font, PDF_FONT_SIZE)
+        for line in shopping_cart_txt(ingredients):
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(font, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            pdf.drawString(PDF_MARGIN, y, line.rstrip('\n'))
+            y -= PDF_FONT_SIZE * 1.5
+        pdf.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(CHUNK_SIZE), b'')
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': (shopping_cart_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_cart_csv, 'text/csv; charset=utf-8'),
+    'pdf': (shopping_cart_pdf, 'application/pdf'),
+}
@@ -1,36 +1,52 @@
-from django.db.models import Sum
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404, redirect
-from django_filters import rest_framework as filters
-from rest_framework import generics, mixins, status, viewsets
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.http import (Http404, HttpResponse, HttpResponseForbidden,
+                         HttpResponseRedirect, JsonResponse,
+                         StreamingHttpResponse)
+from django.shortcuts import get_object_or_404
+from django.utils.crypto import constant_time_compare
+from django.views import View
+from rest_framework import mixins, status, viewsets
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from api.filters import RecipeFilter
-from api.pagination import CustomPagination
+from api import metrics
+from api.filters import RecipeFilter, RecipeIndexFilterBackend
+from api.mixins import CachedResponseMixin, ConditionalGetMixin
+from api.pagination import (CustomPagination, FeedPagination,
+                            KeysetPagination)
+from api.recipe_index import IndexedRecipes, pantry_index
 from api.permissions import IsAuthorOrReadOnly
+from api.search import ingredient_index
 from api.serializers import (
     FavoriteSerializer,
     IngredientSerializer,
     RecipeSerializer,
+    ShoppingCartIngredientSerializer,
     ShoppingCartSerializer,
     SubscriptionSerializer,
     TagSerializer,
     TokenSerializer,
+    UserAvatarSerializer,
     UserCreateSerializer,
     UserSerializer,
+    get_recipes_limit,
 )
-from api.utils import create_file_shopping_cart
+from api.utils import SHOPPING_CART_FORMATS
+from recipes import feed, popularity, short_links
 from recipes.models import (
     Favorite,
     Ingredient,
     Recipe,
-    RecipeIngredient,
     ShoppingCart,
+    ShoppingCartIngredient,
     Tag,
 )
 from users.models import Subscription, User
@@ -61,8 +77,10 @@ class TokenViewSet(ObtainAuthToken):
 
 class Logout(APIView):
     """Класс для удаления токена."""
+    permission_classes = [IsAuthenticated]
+
     def post(self, request, format=None):
-        request.user.auth_token.delete()
+        request.auth.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -77,6 +95,16 @@ class UserViewSet(
     queryset = User.objects.all()
     pagination_class = CustomPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(subscribed=Exists(
+                Subscription.objects.filter(user=user,
+                                            subscribing=OuterRef('pk'))
+            ))
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'create':
             return UserCreateSerializer
@@ -97,14 +125,16 @@ class UserAvatarView(APIView):
     permission_classes = [IsAuthenticated]
 
     def put(self, request):
-        request.user.avatar = request.data['avatar']
-        request.user.save()
-        return Response(request.data)
+        serializer = UserAvatarSerializer(request.user, data=request.data,
+                                          context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
 
     def delete(self, request):
         request.user.avatar.delete(save=False)
         request.user.avatar = None
-        request.user.save()
+        request.user.save(update_fields=['avatar'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -115,65 +145,127 @@ class UserPasswordView(APIView):
     def post(self, request):
         if request.user.password == request.data['current_password']:
             request.user.password = request.data['new_password']
-            request.user.save()
+            request.user.save(update_fields=['password'])
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'message': 'Введенный пароль не совпадает с текущим'},
                         status=status.HTTP_400_BAD_REQUEST)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, CachedResponseMixin,
+                    viewsets.ModelViewSet):
     """Класс для работы с рецептами."""
+    cache_namespaces = ('recipes', 'tags', 'ingredients', 'authors')
+    cache_anonymous_only = True
+    conditional_anonymous_only = True
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
-    pagination_class = CustomPagination
-    filter_backends = (filters.DjangoFilterBackend,)
+    pagination_class = KeysetPagination
+    filter_backends = (RecipeIndexFilterBackend,)
     filterset_class = RecipeFilter
     http_method_names = ['get', 'post', 'delete', 'patch']
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        page = self.request.query_params.get('page', None)
-        if page is not None:
-            limit = self.pagination_class.default_limit
-            offset = (int(page) - 1) * limit
-            self.request.query_params._mutable = True
-            self.request.query_params['offset'] = offset
-            self.request.query_params['limit'] = limit
-            self.request.query_params._mutable = False
+        if self.action in ('list', 'retrieve', 'pantry', 'feed', 'popular'):
+            queryset = (queryset.with_related()
+                        .with_user_flags(self.request.user))
         return queryset
 
     def get_permissions(self):
-        if self.request == 'post':
+        if self.action == 'feed':
+            return [IsAuthenticated()]
+        if self.request.method == 'POST':
             return [IsAuthenticated()]
-        if self.request in ['patch', 'delete']:
+        if self.request.method in ['PATCH', 'DELETE']:
             return [IsAuthorOrReadOnly()]
         return super().get_permissions()
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def get_pantry_ingredients(self, request):
+        values = [value for item in request.query_params.getlist(
+            'ingredients') for value in item.split(',') if value]
+        try:
+            ingredient_ids = {int(value) for value in values}
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'Ожидаются id ингредиентов через запятую.'})
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Укажите хотя бы один ингредиент.'})
+        if len(ingredient_ids) > settings.PANTRY_MAX_INGREDIENTS:
+            raise ValidationError(
+                {'ingredients': 'Не больше '
+                 f'{settings.PANTRY_MAX_INGREDIENTS} ингредиентов.'})
+        return ingredient_ids
+
+    def pantry(self, request):
+        """Рецепты, которые можно приготовить из переданных продуктов."""
+        ingredient_ids = self.get_pantry_ingredients(request)
+        paginator = self.paginator
+        # Лишний рецепт показывает пагинатору, что есть следующая страница.
+        matches = pantry_index.match(
+            ingredient_ids,
+            paginator.get_offset(request) + paginator.get_limit(request) + 1,
+        )
+        page = self.paginate_queryset(
+            IndexedRecipes(self.get_queryset(), matches))
+        data = self.get_serializer(page, many=True).data
+        for item in data:
+            item['coverage'] = round(float(matches.coverage[item['id']]), 3)
+        return self.get_paginated_response(data)
+
+    def popular(self, request):
+        """Самые популярные рецепты, при параметре tag — в этом тэге."""
+        ids = popularity.top(request.query_params.get('tag') or None)
+        page = self.paginate_queryset(
+            IndexedRecipes(self.get_queryset(), ids))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь."""
+        paginator = FeedPagination()
+        page = paginator.paginate_feed(partial(feed.page, request.user),
+                                       self.get_queryset(), request)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
 
 class TagViewSet(
+    ConditionalGetMixin,
+    CachedResponseMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet
 ):
     """Класс для работы с тэгами."""
+    cache_namespaces = ('tags',)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
 
 class IngredientViewSet(
+    ConditionalGetMixin,
+    CachedResponseMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet
 ):
     """Класс для работы с ингредиентами."""
+    cache_namespaces = ('ingredients',)
+    queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
 
-    def get_queryset(self):
-        name = self.request.query_params.get('name', '')
-        return Ingredient.objects.filter(name__icontains=name)
+    def list(self, request, *args, **kwargs):
+        """Список отдаётся из индекса в памяти, минуя кэш ответов."""
+        return self.conditional_response(self.search, request,
+                                         *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '')
+        return Response(ingredient_index.search(name))
 
 
 class SubscribtionCreateDestroyViewSet(
@@ -187,6 +279,7 @@ class SubscribtionCreateDestroyViewSet(
     serializer_class = SubscriptionSerializer
     pagination_class = CustomPagination
 
+    @transaction.atomic
     def perform_create(self, serializer):
         user = self.request.user
         subscribing = get_object_or_404(
@@ -215,24 +308,28 @@ class SubscribtionCreateDestroyViewSet(
 
 class SubscriptionListViewSet(viewsets.ModelViewSet):
     """Получение списка подписок."""
-    queryset = Subscription.objects.all()
-    filter_backends = (filters.DjangoFilterBackend,)
-    filterset_fields = ('user',)
+    queryset = Subscription.objects.select_related('subscribing')
     permission_classes = [IsAuthenticated]
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
     serializer_class = SubscriptionSerializer
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        page = self.request.query_params.get('page', None)
-        if page is not None:
-            limit = self.pagination_class.default_limit
-            offset = (int(page) - 1) * limit
-            self.request.query_params._mutable = True
-            self.request.query_params['offset'] = offset
-            self.request.query_params['limit'] = limit
-            self.request.query_params._mutable = False
-        return queryset
+        return super().get_queryset().filter(
+            user=self.request.user).order_by('id')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['author_recipes'] = getattr(self, 'author_recipes', {})
+        return context
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        subscriptions = queryset if page is None else page
+        self.author_recipes = Recipe.objects.latest_by_author(
+            [subscription.subscribing_id for subscription in subscriptions],
+            get_recipes_limit(self.request),
+        )
+        return page
 
 
 class FavoriteViewSet(
@@ -252,6 +349,7 @@ class FavoriteViewSet(
             return [IsAuthorOrReadOnly()]
         return super().get_permissions()
 
+    @transaction.atomic
     def perform_create(self, serializer):
         user = self.request.user
         recipe = get_object_or_404(
@@ -293,6 +391,7 @@ class ShoppingCartViewSet(
             return [IsAuthorOrReadOnly()]
         return super().get_permissions()
 
+    @transaction.atomic
     def perform_create(self, serializer):
         user = self.request.user
         recipe = get_object_or_404(
@@ -315,35 +414,82 @@ class ShoppingCartViewSet(
         except ShoppingCart.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+    def summary(self, request):
+        ingredients = (ShoppingCartIngredient.objects
+                       .filter(user=request.user)
+                       .select_related('ingredient')
+                       .order_by('ingredient__name', 'measurement_unit'))
+        serializer = ShoppingCartIngredientSerializer(ingredients, many=True)
+        return Response(serializer.data)
+
+    def perform_content_negotiation(self, request, force=False):
+        if self.action == 'download_txt':
+            force = True
+        return super().perform_content_negotiation(request, force)
+
     def download_txt(self, request):
-        ingredients = (RecipeIngredient.objects
-                       .filter(recipes__shoppingcart__user=request.user)
-                       .values('name__name', 'measurement_unit')
-                       .annotate(total_amount=Sum('amount'))
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in SHOPPING_CART_FORMATS:
+            return Response(
+                {'format': f'Доступные форматы: '
+                           f'{", ".join(SHOPPING_CART_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        render, content_type = SHOPPING_CART_FORMATS[file_format]
+        ingredients = (ShoppingCartIngredient.objects
+                       .filter(user=request.user)
+                       .values('measurement_unit', 'total_amount',
+                               name=F('ingredient__name'))
+                       .order_by('name', 'measurement_unit')
                        )
-        response = HttpResponse(content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; \
-                                           filename="shopping_cart.txt"'
-        content = create_file_shopping_cart(ingredients)
-        response.write(content)
+        response = StreamingHttpResponse(render(ingredients.iterator()),
+                                         content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"')
         return response
 
 
-class RecipeGetLinkView(generics.GenericAPIView):
-    """Класс для получения короткой ссылки для рецепта."""
+class RecipeGetLinkView(View):
+    """Класс для получения короткой ссылки для рецепта.
+
+    Обычное представление Django без аутентификации и согласования
+    формата DRF: ответ публичный и состоит из одного поля.
+    """
+
     def get(self, request, recipe_id):
-        try:
-            recipe = Recipe.objects.get(id=recipe_id)
-            short_link = request.build_absolute_uri(
-                f'/s/{recipe.short_link}/')
-            return Response({'short-link': short_link})
-        except Recipe.DoesNotExist:
-            raise NotFound("Рецепт не найден.")
+        found = list(Recipe.objects.filter(id=recipe_id)
+                     .values_list('short_link', flat=True))
+        if not found:
+            return JsonResponse({'detail': 'Рецепт не найден.'},
+                                status=status.HTTP_404_NOT_FOUND)
+        short_link = found[0] or short_links.encode(recipe_id)
+        return JsonResponse({'short-link': request.build_absolute_uri(
+            f'/s/{short_link}/')})
 
 
-class RedirectShortLinkView(APIView):
+class RedirectShortLinkView(View):
     """Класс для переадресации по короткой ссылке."""
+
     def get(self, request, short_link):
-        recipe = get_object_or_404(Recipe, short_link=short_link)
-        return redirect(request.build_absolute_uri(
-            f'/recipes/{recipe.id}/'))
+        try:
+            recipe_id = short_links.resolve(short_link)
+        except Recipe.DoesNotExist:
+            raise Http404('Рецепт не найден.')
+        return HttpResponseRedirect(request.build_absolute_uri(
+            f'/recipes/{recipe_id}/'))
+
+
+class MetricsView(View):
+    """Класс для выдачи метрик процесса в формате Prometheus."""
+
+    def get(self, request):
+        # Без METRICS_TOKEN метрики не отдаются вовсе, чтобы они не
+        # оказались открытыми по ошибке конфигурации.
+        if not settings.METRICS_TOKEN:
+            raise Http404
+        if not constant_time_compare(
+                request.headers.get('Authorization', ''),
+                f'Bearer {settings.METRICS_TOKEN}'):
+            return HttpResponseForbidden()
+        return HttpResponse(metrics.registry.render(),
+                            content_type='text/plain; version=0.0.4')
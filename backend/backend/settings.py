@@ -34,9 +34,12 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
+    'api.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -118,7 +121,7 @@ USE_TZ = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -145,5 +148,61 @@ MAX_USERNAME_LENGTH = 150
 USERNAME_REGEX = r'^[\w.@+-]+$'
 MIN_VALUE = 1
 MAX_LENGTH = 50
-SHORT_LINK_MAX_LENGTH = 4
+SHORT_LINK_LENGTH = 6
+SHORT_LINK_SALT = os.getenv('SHORT_LINK_SALT', 'foodgram')
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 10000))
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+# Версии кэша, токены и журнал изменений индексов должны быть общими для
+# всех процессов gunicorn и фонового исполнителя, поэтому по умолчанию
+# используется memcached. LocMemCache годится только для одного процесса.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.memcached.PyMemcacheCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', '127.0.0.1:11211'),
+    }
+}
+if CACHE_BACKEND.endswith('PyMemcacheCache'):
+    # Недоступный memcached превращается в промахи кэша, а не в 500.
+    CACHES['default']['OPTIONS'] = {'ignore_exc': True, 'no_delay': True}
+IMAGE_RENDITION_WIDTHS = [
+    int(width) for width in
+    os.getenv('IMAGE_RENDITION_WIDTHS', '160,320,640').split(',')
+]
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False').lower() == 'true'
+JOBS_POOL = os.getenv('JOBS_POOL', 'thread')
+JOBS_CONCURRENCY = int(os.getenv('JOBS_CONCURRENCY', 2))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', 10))
+JOBS_STALE_GRACE = int(os.getenv('JOBS_STALE_GRACE', 60))
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 300))
+TOKEN_CACHE_LOCAL_TIMEOUT = int(os.getenv('TOKEN_CACHE_LOCAL_TIMEOUT', 10))
+SERVER_TIMING_ENABLED = os.getenv(
+    'SERVER_TIMING_ENABLED', 'True').lower() == 'true'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+NPLUSONE_RAISE = os.getenv('NPLUSONE_RAISE', 'False').lower() == 'true'
+NPLUSONE_SAMPLE_RATE = float(os.getenv('NPLUSONE_SAMPLE_RATE', 0.01))
+TEST_RUNNER = 'api.test_runner.NPlusOneTestRunner'
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+RECIPE_FILTER_ENGINE = os.getenv('RECIPE_FILTER_ENGINE', 'database')
+RECIPE_INDEX_TTL = int(os.getenv('RECIPE_INDEX_TTL', 3600))
+RECIPE_INDEX_LOCAL_TTL = int(os.getenv('RECIPE_INDEX_LOCAL_TTL', 30))
+RECIPE_INDEX_MAX_LAG = int(os.getenv('RECIPE_INDEX_MAX_LAG', 1000))
+PANTRY_MAX_INGREDIENTS = int(os.getenv('PANTRY_MAX_INGREDIENTS', 50))
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', 100))
+FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', 1000))
+POPULARITY_HALF_LIFE = int(os.getenv('POPULARITY_HALF_LIFE', 7 * 24 * 3600))
+POPULARITY_FAVORITE_WEIGHT = float(os.getenv('POPULARITY_FAVORITE_WEIGHT', 2))
+POPULARITY_CART_WEIGHT = float(os.getenv('POPULARITY_CART_WEIGHT', 1))
+POPULARITY_TOP_SIZE = int(os.getenv('POPULARITY_TOP_SIZE', 100))
+POPULARITY_CACHE_TIMEOUT = int(os.getenv('POPULARITY_CACHE_TIMEOUT', 300))
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_after',
+                    'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    readonly_fields = ('locked_at', 'locked_by', 'last_error', 'created_at',
+                       'finished_at')
+
+
+admin.site.register(Job, JobAdmin)
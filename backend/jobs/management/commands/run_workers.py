@@ -0,0 +1,202 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs import queue
+
+
+def run_in_child(name, payload, conn):
+    """Точка входа дочернего процесса: сообщает родителю об ошибке."""
+    # Обработчики остановки унаследованы от родителя при fork: SIGTERM
+    # должен завершать процесс, а Ctrl+C ждёт, пока задачу доделают.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if not apps.ready:
+        django.setup()
+    try:
+        queue.execute(name, payload)
+    except BaseException as e:
+        conn.send(queue.format_error(e))
+    else:
+        conn.send(None)
+    finally:
+        conn.close()
+
+
+class ThreadRunner:
+    """Выполняет задачи в потоках одного процесса.
+
+    Поток нельзя прервать, поэтому задача, вышедшая за таймаут,
+    считается неудачной, а поток дорабатывает и до тех пор занимает
+    место в пуле.
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.abandoned = []
+
+    def free_slots(self, running):
+        self.abandoned = [future for future in self.abandoned
+                          if not future.done()]
+        return self.concurrency - len(running) - len(self.abandoned)
+
+    def start(self, job):
+        return self.executor.submit(queue.execute, job.name, job.payload)
+
+    def result(self, handle):
+        """None, пока задача идёт, иначе (успех, текст ошибки)."""
+        if not handle.done():
+            return None
+        error = handle.exception()
+        if error is None:
+            return True, ''
+        return False, queue.format_error(error)
+
+    def cancel(self, handle):
+        self.abandoned.append(handle)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class ProcessRunner:
+    """Выполняет каждую задачу в отдельном дочернем процессе.
+
+    Не больше concurrency процессов одновременно; процесс, вышедший за
+    таймаут, завершается сигналом.
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        method = ('fork' if 'fork' in multiprocessing.get_all_start_methods()
+                  else 'spawn')
+        self.context = multiprocessing.get_context(method)
+
+    def free_slots(self, running):
+        return self.concurrency - len(running)
+
+    def start(self, job):
+        # Дочерний процесс не должен делить сокет соединения с родителем.
+        connections.close_all()
+        receiver, sender = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=run_in_child, args=(job.name, job.payload, sender),
+            daemon=True)
+        process.start()
+        sender.close()
+        return process, receiver
+
+    def result(self, handle):
+        process, receiver = handle
+        if receiver.poll():
+            try:
+                error = receiver.recv()
+            except EOFError:
+                error = 'Процесс завершился без ответа'
+            process.join()
+            receiver.close()
+            return error is None, error or ''
+        if not process.is_alive():
+            process.join()
+            receiver.close()
+            return False, f'Процесс завершился с кодом {process.exitcode}'
+        return None
+
+    def cancel(self, handle):
+        process, receiver = handle
+        process.terminate()
+        process.join()
+        receiver.close()
+
+    def shutdown(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Запустить исполнителей фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pool', choices=('thread', 'process'),
+                            default=settings.JOBS_POOL,
+                            help='Потоки или дочерние процессы')
+        parser.add_argument('--concurrency', type=int,
+                            default=settings.JOBS_CONCURRENCY,
+                            help='Сколько задач выполнять одновременно')
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.JOBS_POLL_INTERVAL,
+                            help='Пауза между опросами пустой очереди, с')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и выйти')
+
+    def handle(self, *args, **options):
+        runner_class = (ProcessRunner if options['pool'] == 'process'
+                        else ThreadRunner)
+        runner = runner_class(options['concurrency'])
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.stop)
+        self.stdout.write(
+            f'Исполнитель {worker}: {options["pool"]} '
+            f'x{options["concurrency"]}')
+        running = {}
+        stats = {'done': 0, 'failed': 0}
+        last_release = 0.0
+        try:
+            while True:
+                if time.monotonic() - last_release > settings.JOBS_STALE_GRACE:
+                    queue.release_stale()
+                    last_release = time.monotonic()
+                claimed = []
+                free = runner.free_slots(running)
+                if not self.stopping and free > 0:
+                    claimed = queue.claim(worker, free)
+                    for job in claimed:
+                        running[job.pk] = (
+                            job, runner.start(job),
+                            time.monotonic() + job.timeout)
+                progressed = self.collect(runner, running, stats)
+                if not running and (self.stopping or (
+                        options['once'] and not claimed)):
+                    break
+                if not claimed and not progressed:
+                    time.sleep(options['poll_interval'] if not running
+                               else min(options['poll_interval'], 0.05))
+        finally:
+            runner.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено {stats["done"]}, с ошибкой {stats["failed"]}'))
+
+    def collect(self, runner, running, stats):
+        progressed = False
+        for pk, (job, handle, deadline) in list(running.items()):
+            result = runner.result(handle)
+            if result is None and time.monotonic() > deadline:
+                runner.cancel(handle)
+                result = False, f'Превышен таймаут {job.timeout} с'
+            if result is None:
+                continue
+            progressed = True
+            del running[pk]
+            succeeded, error = result
+            if succeeded:
+                queue.finish(job)
+                stats['done'] += 1
+            else:
+                queue.fail(job, error)
+                stats['failed'] += 1
+                self.stderr.write(f'{job}: {error.strip().splitlines()[-1]}')
+        return progressed
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,126 @@
+"""Очередь фоновых задач в базе данных.
+
+Задачи регистрируются декоратором task в модулях tasks.py приложений и
+ставятся в очередь через enqueue. Строка Job создаётся в текущей
+транзакции, поэтому задача становится видна исполнителям только вместе
+с данными, ради которых её поставили.
+"""
+import traceback
+from collections import namedtuple
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from jobs.models import Job
+
+
+Task = namedtuple('Task', 'name func max_attempts timeout')
+TASKS = {}
+
+
+def task(name, max_attempts=3, timeout=60):
+    """Регистрирует функцию как фоновую задачу."""
+    def decorator(func):
+        TASKS[name] = Task(name, func, max_attempts, timeout)
+        return func
+    return decorator
+
+
+def enqueue(name, **payload):
+    """Ставит задачу в очередь.
+
+    С JOBS_EAGER задача выполняется в этом же процессе сразу после
+    фиксации транзакции: так удобно разрабатывать без исполнителя.
+    """
+    try:
+        spec = TASKS[name]
+    except KeyError:
+        raise ValueError(f'Неизвестная задача: {name}')
+    if settings.JOBS_EAGER:
+        transaction.on_commit(partial(spec.func, **payload))
+        return None
+    return Job.objects.create(name=name, payload=payload,
+                              max_attempts=spec.max_attempts,
+                              timeout=spec.timeout)
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых задач и помечает их выполняемыми.
+
+    Где база умеет SELECT ... FOR UPDATE SKIP LOCKED, параллельные
+    исполнители пропускают чужие строки, не дожидаясь их. На SQLite
+    каждая строка забирается условным UPDATE по статусу: запись в базу
+    и так идёт по одной, и задачу получит ровно один исполнитель.
+    """
+    now = timezone.now()
+    queryset = Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+    claimed = {'status': Job.RUNNING, 'locked_at': now, 'locked_by': worker,
+               'attempts': F('attempts') + 1}
+    if connections[queryset.db].features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            jobs = list(queryset.select_for_update(skip_locked=True)[:limit])
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                **claimed)
+    else:
+        jobs = [job for job in queryset[:limit]
+                if Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+                    **claimed)]
+    for job in jobs:
+        job.status = Job.RUNNING
+        job.locked_at = now
+        job.locked_by = worker
+        job.attempts += 1
+    return jobs
+
+
+def execute(name, payload):
+    """Выполняет задачу и закрывает соединения с базой своего потока."""
+    try:
+        TASKS[name].func(**payload)
+    finally:
+        connections.close_all()
+
+
+def _owned(job):
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING,
+                              locked_by=job.locked_by)
+
+
+def finish(job):
+    _owned(job).update(status=Job.DONE, finished_at=timezone.now(),
+                       last_error='')
+
+
+def fail(job, error):
+    """Возвращает задачу в очередь с задержкой или помечает ошибкой."""
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+        _owned(job).update(
+            status=Job.QUEUED, run_after=now + timedelta(seconds=delay),
+            last_error=error)
+    else:
+        _owned(job).update(status=Job.FAILED, finished_at=now,
+                           last_error=error)
+
+
+def format_error(exc):
+    return ''.join(traceback.format_exception(type(exc), exc,
+                                              exc.__traceback__))
+
+
+def release_stale():
+    """Возвращает в очередь задачи исполнителей, которые пропали."""
+    now = timezone.now()
+    grace = timedelta(seconds=settings.JOBS_STALE_GRACE)
+    released = 0
+    for job in Job.objects.filter(status=Job.RUNNING,
+                                  locked_at__lt=now - grace):
+        if job.locked_at + timedelta(seconds=job.timeout) + grace < now:
+            fail(job, f'Исполнитель {job.locked_by} не завершил задачу')
+            released += 1
+    return released
@@ -6,21 +6,17 @@ from .models import (
     Recipe,
     RecipeIngredient,
     ShoppingCart,
+    ShoppingCartIngredient,
     Tag,
 )
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'favorite_count')
+    list_display = ('name', 'author', 'favorites_count')
     list_filter = ('tags',)
     search_fields = ('author__username', 'name', 'tags__name')
     ordering = ('name',)
 
-    def favorite_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
-
-    favorite_count.short_description = 'Число добавлений в избранное'
-
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
@@ -34,3 +30,4 @@ admin.site.register(Tag)
 admin.site.register(Favorite)
 admin.site.register(RecipeIngredient)
 admin.site.register(ShoppingCart)
+admin.site.register(ShoppingCartIngredient)
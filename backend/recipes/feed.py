@@ -0,0 +1,88 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Рецепт обычного автора при публикации раскладывается по лентам всех его
+подписчиков (FeedEntry), и чтение ленты — это выборка по индексу
+(user, recipe). Рецепты авторов, у которых подписчиков больше
+FEED_FANOUT_LIMIT, не раскладываются: их читатель добирает при чтении
+прямо из Recipe по индексу (author, id) и сливает с лентой по id.
+"""
+from django.conf import settings
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription, User
+
+
+def is_fanned_out(subscribers_count):
+    return subscribers_count <= settings.FEED_FANOUT_LIMIT
+
+
+def fan_out(recipe_id):
+    """Раскладывает рецепт по лентам подписчиков автора."""
+    recipe = (Recipe.objects.filter(pk=recipe_id)
+              .values('author_id', 'author__subscribers_count').first())
+    if recipe is None or not is_fanned_out(
+            recipe['author__subscribers_count']):
+        return
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                   author_id=recipe['author_id'])
+         for user_id in Subscription.objects.filter(
+             subscribing=recipe['author_id']).values_list(
+                 'user_id', flat=True).iterator()),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_ids, author_id):
+    """Кладёт в ленты user_ids последние рецепты автора."""
+    recipe_ids = list(
+        Recipe.objects.filter(
+            author=author_id,
+            author__subscribers_count__lte=settings.FEED_FANOUT_LIMIT,
+        ).order_by('-id').values_list('id', flat=True)[
+            :settings.FEED_BACKFILL_SIZE])
+    if not recipe_ids:
+        return
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                   author_id=author_id)
+         for user_id in user_ids for recipe_id in recipe_ids),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_subscribers(author_id):
+    """Заполняет ленты всех подписчиков автора, переставшего быть
+    слишком популярным для раскладки."""
+    backfill(list(Subscription.objects.filter(
+        subscribing=author_id).values_list('user_id', flat=True)),
+        author_id)
+
+
+def forget(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(user=user_id, author=author_id).delete()
+
+
+def page(user, limit, before=None):
+    """Возвращает id рецептов ленты от новых к старым.
+
+    Берёт limit + 1 записей ленты и столько же рецептов популярных
+    авторов с id меньше before, сливает их, и лишний id показывает, что
+    есть следующая страница.
+    """
+    entries = FeedEntry.objects.filter(user=user).order_by('-recipe_id')
+    popular = Recipe.objects.filter(
+        author__in=User.objects.filter(
+            subscribing__user=user,
+            subscribers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values('id'),
+    ).order_by('-id')
+    if before is not None:
+        entries = entries.filter(recipe_id__lt=before)
+        popular = popular.filter(id__lt=before)
+    ids = set(entries.values_list('recipe_id', flat=True)[:limit + 1])
+    ids.update(popular.values_list('id', flat=True)[:limit + 1])
+    return sorted(ids, reverse=True)[:limit + 1]
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from recipes import renditions
+from recipes.models import Recipe
+from users.models import User
+
+TARGETS = (
+    (Recipe, 'image', 'image_renditions'),
+    (User, 'avatar', 'avatar_renditions'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Собрать уменьшенные копии картинок рецептов и аватаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересобрать и актуальные копии')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, что нужно пересобрать')
+
+    def handle(self, *args, **options):
+        for model, field_name, renditions_name in TARGETS:
+            queryset = (model.objects.exclude(**{field_name: ''})
+                        .exclude(**{f'{field_name}__isnull': True})
+                        .only('pk', field_name, renditions_name)
+                        .order_by('pk'))
+            built = 0
+            for instance in queryset.iterator():
+                if not options['force'] and not renditions.is_stale(
+                        getattr(instance, field_name),
+                        getattr(instance, renditions_name)):
+                    continue
+                built += 1
+                if options['dry_run']:
+                    continue
+                renditions.rebuild(instance, field_name, renditions_name)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: '
+                f'{"нужно пересобрать" if options["dry_run"] else "собрано"}'
+                f' {built}'
+            ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import RecipeIngredient
+
+
+class Command(BaseCommand):
+    help = ('Удалить ингредиенты рецептов, на которые не ссылается '
+            'ни один рецепт')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Сколько строк удалять за один запрос')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать строки без удаления')
+
+    def handle(self, *args, **options):
+        orphans = RecipeIngredient.objects.filter(recipes__isnull=True)
+        if options['dry_run']:
+            self.stdout.write(f'Найдено строк без рецепта: {orphans.count()}')
+            return
+        deleted = 0
+        while True:
+            batch = list(orphans.order_by('id').values_list(
+                'id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            RecipeIngredient.objects.filter(id__in=batch).delete()
+            deleted += len(batch)
+            self.stdout.write(f'Удалено {deleted}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено строк без рецепта: {deleted}'))
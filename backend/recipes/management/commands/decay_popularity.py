@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from recipes import popularity
+
+
+class Command(BaseCommand):
+    help = ('Привести очки популярности рецептов к новому началу эпохи '
+            'и сбросить закэшированные топы')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recompute', action='store_true',
+                            help='Пересчитать очки заново из избранного '
+                                 'и списков покупок')
+
+    def handle(self, *args, **options):
+        if options['recompute']:
+            count = popularity.recompute()
+            self.stdout.write(f'Пересчитаны очки {count} рецептов')
+        else:
+            count = popularity.rebase()
+            self.stdout.write(f'Сдвинуты очки {count} рецептов')
+        popularity.reset_top()
+        self.stdout.write(self.style.SUCCESS('Готово: топы сброшены'))
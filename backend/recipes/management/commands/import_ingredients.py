@@ -1,48 +1,171 @@
-# import json
-# from django.core.management.base import BaseCommand
-# from recipes.models import Ingredient
+import csv
+import json
+import os
+import time
+from functools import partial
+from itertools import islice
 
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
 
-# class Command(BaseCommand):
-#     help = 'Импортировать ингредиенты из JSON файла'
+from api.cache import bump
+from recipes.models import Ingredient
 
-#     def add_arguments(self, parser):
-#         parser.add_argument('/data/ingredients.json',
-#                             type=str, help='Путь к JSON файлу')
+CHUNK_SIZE = 64 * 1024
 
-#     def handle(self, *args, **kwargs):
-#         file_path = kwargs['/data/ingredients.json']
-#         try:
-#             with open(file_path) as f:
-#                 data = json.load(f)
-#                 for item in data:
-#                     ingredient = Ingredient(**item)
-#                     ingredient.save()
-#                     self.stdout.write(
-#                         self.style.SUCCESS(f'Успешно добавлено: {item}'))
-#         except Exception as e:
-#             self.stdout.write(self.style.ERROR(f'Ошибка: {str(e)}'))
 
+class InsertedRows:
+    """Считает строки, которые INSERT действительно добавил.
 
-import json
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
-import os
+    bulk_create с ignore_conflicts возвращает все переданные объекты,
+    в том числе пропущенные из-за конфликта, а rowcount курсора — только
+    вставленные.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if sql.lstrip().upper().startswith('INSERT'):
+            self.count += max(context['cursor'].rowcount, 0)
+        return result
+
+
+def iter_json(f):
+    """Построчно разбирает JSON-массив объектов, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    consumed = 0
+    started = False
+    eof = False
+    while True:
+        if not eof:
+            chunk = f.read(CHUNK_SIZE)
+            eof = not chunk
+            consumed += position
+            buffer = buffer[position:] + chunk
+            position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив ингредиентов')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise CommandError('Некорректный JSON около символа '
+                                       f'{consumed + position}')
+                break
+            yield item
+        if eof:
+            raise CommandError('Файл оборвался до конца JSON-массива')
+
+
+def iter_csv(f):
+    for row in csv.reader(f):
+        if not row or row == ['name', 'measurement_unit']:
+            continue
+        if len(row) != 2:
+            raise CommandError(f'Некорректная строка CSV: {row}')
+        yield {'name': row[0], 'measurement_unit': row[1]}
 
 
 class Command(BaseCommand):
-    help = 'Импортировать ингредиенты из JSON файла'
+    help = 'Импортировать ингредиенты из JSON или CSV файла'
 
-    JSON_FILE_PATH = os.path.join('data', 'ingredients.json')
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?',
+                            default=os.path.join('data', 'ingredients.json'),
+                            help='Путь к JSON или CSV файлу')
+        parser.add_argument('--format', choices=('json', 'csv'),
+                            help='Формат файла, по умолчанию по расширению')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Размер пачки для записи в базу')
+        parser.add_argument('--on-conflict', choices=('skip', 'update'),
+                            default='skip',
+                            help='Что делать с уже существующими названиями')
 
-    def handle(self, *args, **kwargs):
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(
+            path)[1].lstrip('.').lower()
+        if file_format not in ('json', 'csv'):
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        self.stats = {'created': 0, 'updated': 0, 'skipped': 0}
+        start = time.monotonic()
+        processed = 0
         try:
-            with open(self.JSON_FILE_PATH) as f:
-                data = json.load(f)
-                for item in data:
-                    ingredient = Ingredient(**item)
-                    ingredient.save()
+            with open(path, encoding='utf-8', newline='') as f:
+                rows = iter_json(f) if file_format == 'json' else iter_csv(f)
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    self.write_batch(batch, options['on_conflict'])
+                    processed += len(batch)
+                    elapsed = max(time.monotonic() - start, 1e-6)
                     self.stdout.write(
-                        self.style.SUCCESS(f'Успешно добавлено: {item}'))
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Ошибка: {str(e)}'))
+                        f'Обработано {processed} строк, '
+                        f'{processed / elapsed:.0f} строк/с'
+                    )
+        except OSError as e:
+            raise CommandError(f'Ошибка: {e}')
+        elapsed = max(time.monotonic() - start, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {elapsed:.1f} с ({processed / elapsed:.0f} строк/с): '
+            f'добавлено {self.stats["created"]}, '
+            f'обновлено {self.stats["updated"]}, '
+            f'пропущено {self.stats["skipped"]}'
+        ))
+
+    @transaction.atomic
+    def write_batch(self, batch, on_conflict):
+        units = {}
+        for item in batch:
+            try:
+                units[item['name']] = item['measurement_unit']
+            except (KeyError, TypeError):
+                raise CommandError(f'Некорректная запись: {item}')
+        existing = {
+            name: (pk, unit) for pk, name, unit in
+            Ingredient.objects.filter(name__in=units).values_list(
+                'id', 'name', 'measurement_unit')
+        }
+        # Параллельный импорт может вставить те же названия между
+        # выборкой existing и вставкой, такие строки пропускаются.
+        new = [Ingredient(name=name, measurement_unit=unit)
+               for name, unit in units.items() if name not in existing]
+        inserted = InsertedRows()
+        with connection.execute_wrapper(inserted):
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+        created = inserted.count
+        self.stats['created'] += created
+        now = timezone.now()
+        changed = [
+            Ingredient(id=existing[name][0], name=name,
+                       measurement_unit=unit, updated_at=now)
+            for name, unit in units.items()
+            if name in existing and existing[name][1] != unit
+        ]
+        if on_conflict == 'update' and changed:
+            Ingredient.objects.bulk_update(
+                changed, ['measurement_unit', 'updated_at'])
+            self.stats['updated'] += len(changed)
+        # bulk_create и bulk_update не шлют сигналов, поэтому кэш ответов
+        # и индекс автодополнения сбрасываются здесь.
+        if created or (on_conflict == 'update' and changed):
+            transaction.on_commit(partial(bump, 'ingredients'))
+        self.stats['skipped'] += len(existing) + len(new) - created - (
+            len(changed) if on_conflict == 'update' else 0)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes import feed
+from recipes.models import FeedEntry
+from users.models import Subscription
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать ленты подписок из подписок и рецептов'
+
+    def handle(self, *args, **options):
+        author_ids = sorted(set(
+            Subscription.objects.values_list('subscribing_id', flat=True)))
+        FeedEntry.objects.all().delete()
+        for author_id in author_ids:
+            with transaction.atomic():
+                feed.backfill_subscribers(author_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: авторов {len(author_ids)}, '
+            f'записей в лентах {FeedEntry.objects.count()}'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes import search
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать поисковый индекс рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Сколько рецептов индексировать за раз')
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError(
+                f'Поиск не поддерживается для базы {connection.vendor}')
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        queryset = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk = 0
+        total = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[
+                :options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                search.index_recipes(batch)
+            last_pk = batch[-1]
+            total += len(batch)
+            self.stdout.write(f'Проиндексировано {total} рецептов')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: проиндексировано {total} рецептов'))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingCart, ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать суммы ингредиентов в списках покупок '
+            'и сообщить о расхождениях')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько пользователей обрабатывать за раз')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только найти расхождения')
+
+    def handle(self, *args, **options):
+        user_ids = sorted(
+            set(ShoppingCart.objects.values_list('user_id', flat=True))
+            | set(ShoppingCartIngredient.objects.values_list('user_id',
+                                                             flat=True))
+        )
+        drift = 0
+        batch_size = options['batch_size']
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            drift += self.rebuild(batch, options['dry_run'])
+        message = f'Пользователей: {len(user_ids)}, расхождений: {drift}'
+        if drift:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    @transaction.atomic
+    def rebuild(self, user_ids, dry_run):
+        expected = ShoppingCartIngredient.objects.expected_totals(user_ids)
+        actual = {
+            (user_id, ingredient, unit): amount
+            for user_id, ingredient, unit, amount in
+            ShoppingCartIngredient.objects.select_for_update()
+            .filter(user_id__in=user_ids)
+            .values_list('user_id', 'ingredient_id', 'measurement_unit',
+                         'total_amount')
+        }
+        drift = 0
+        for key in expected.keys() | actual.keys():
+            if expected.get(key) != actual.get(key):
+                drift += 1
+                self.stdout.write(
+                    f'Пользователь {key[0]}, ингредиент {key[1]} '
+                    f'({key[2]}): в таблице {actual.get(key, 0)}, '
+                    f'должно быть {expected.get(key, 0)}'
+                )
+        if drift and not dry_run:
+            ShoppingCartIngredient.objects.filter(
+                user_id__in=user_ids).delete()
+            ShoppingCartIngredient.objects.bulk_create(
+                ShoppingCartIngredient(user_id=user_id,
+                                       ingredient_id=ingredient,
+                                       measurement_unit=unit,
+                                       total_amount=amount)
+                for (user_id, ingredient, unit), amount in expected.items()
+            )
+        return drift
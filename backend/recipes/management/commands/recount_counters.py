@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe
+from users.models import Subscription, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'subscribing'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитать счётчики избранного, рецептов и подписчиков '
+            'и исправить расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Сколько строк проверять за раз')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только найти расхождения')
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, field, source, lookup in COUNTERS:
+            drift = self.recount(model, field, source, lookup,
+                                 options['batch_size'], options['dry_run'])
+            total += drift
+            self.stdout.write(
+                f'{model.__name__}.{field}: расхождений {drift}')
+        message = f'Всего расхождений: {total}'
+        if total:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def recount(self, model, field, source, lookup, batch_size, dry_run):
+        actual = Coalesce(Subquery(
+            source.objects.filter(**{lookup: OuterRef('pk')})
+            .order_by()
+            .values(lookup)
+            .annotate(total=Count('id'))
+            .values('total')
+        ), 0)
+        queryset = model.objects.order_by('pk')
+        drift = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    queryset.select_for_update()
+                    .filter(pk__gt=last_pk)
+                    .annotate(actual=actual)
+                    .values_list('pk', field, 'actual')[:batch_size]
+                )
+                if not batch:
+                    return drift
+                last_pk = batch[-1][0]
+                changed = [model(pk=pk, **{field: value})
+                           for pk, stored, value in batch if stored != value]
+                drift += len(changed)
+                if changed and not dry_run:
+                    model.objects.bulk_update(changed, [field])
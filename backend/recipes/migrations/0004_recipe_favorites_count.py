@@ -0,0 +1,40 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:39
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Favorite = apps.get_model('recipes', 'Favorite')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    User = apps.get_model('users', 'User')
+    Recipe.objects.update(favorites_count=Coalesce(models.Subquery(
+        Favorite.objects.filter(recipe=models.OuterRef('pk'))
+        .values('recipe')
+        .annotate(total=models.Count('id'))
+        .values('total')
+    ), 0))
+    User.objects.update(recipes_count=Coalesce(models.Subquery(
+        Recipe.objects.filter(author=models.OuterRef('pk'))
+        .order_by()
+        .values('author')
+        .annotate(total=models.Count('id'))
+        .values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shoppingcartingredient'),
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число добавлений в избранное'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
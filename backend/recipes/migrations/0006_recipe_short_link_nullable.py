@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='short_link',
+            field=models.CharField(blank=True, editable=False, max_length=10, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db import migrations
+
+INGREDIENT_NAMES = (
+    "coalesce((SELECT {aggregate}(i.name, ' ') "
+    'FROM recipes_recipe_ingredients ri '
+    'JOIN recipes_recipeingredient r ON r.id = ri.recipeingredient_id '
+    'JOIN recipes_ingredient i ON i.id = r.name_id '
+    "WHERE ri.recipe_id = recipes_recipe.id), '')"
+)
+
+FORWARD = {
+    'postgresql': [
+        ('ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+         None),
+        ('UPDATE recipes_recipe SET search_vector = '
+         "setweight(to_tsvector(%s::regconfig, name), 'A') || "
+         "setweight(to_tsvector(%s::regconfig, text), 'B') || "
+         'setweight(to_tsvector(%s::regconfig, '
+         + INGREDIENT_NAMES.format(aggregate='string_agg') + "), 'C')",
+         [settings.SEARCH_CONFIG] * 3),
+        ('CREATE INDEX recipes_recipe_search_vector_gin '
+         'ON recipes_recipe USING gin (search_vector)', None),
+    ],
+    'sqlite': [
+        ('CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5('
+         'name, text, ingredients, '
+         "tokenize = 'unicode61 remove_diacritics 2')", None),
+        ('INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients) '
+         'SELECT id, name, text, '
+         + INGREDIENT_NAMES.format(aggregate='group_concat')
+         + ' FROM recipes_recipe', None),
+    ],
+}
+
+BACKWARD = {
+    'postgresql': [
+        ('ALTER TABLE recipes_recipe DROP COLUMN search_vector', None),
+    ],
+    'sqlite': [
+        ('DROP TABLE recipes_recipe_fts', None),
+    ],
+}
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql, params in statements.get(vendor, []):
+            schema_editor.execute(sql, params)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_image_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_statements(FORWARD),
+                             run_statements(BACKWARD)),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:33
+
+import time
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.utils.timezone
+
+
+def fill_popularity(apps, schema_editor):
+    # Старые добавления получают дату миграции, поэтому их очки пока
+    # не затухли и равны просто сумме весов.
+    PopularityEpoch = apps.get_model('recipes', 'PopularityEpoch')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    PopularityEpoch.objects.create(pk=1, started=time.time())
+    scores = [
+        Coalesce(models.Subquery(
+            model.objects.filter(recipe=models.OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(total=models.Count('id'))
+            .values('total')
+        ), 0) * weight
+        for model, weight in (
+            (apps.get_model('recipes', 'Favorite'),
+             settings.POPULARITY_FAVORITE_WEIGHT),
+            (apps.get_model('recipes', 'ShoppingCart'),
+             settings.POPULARITY_CART_WEIGHT),
+        )
+    ]
+    Recipe.objects.update(popularity=models.ExpressionWrapper(
+        scores[0] + scores[1], output_field=models.FloatField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_feed_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.FloatField(verbose_name='Начало эпохи, Unix-время')),
+            ],
+            options={
+                'verbose_name': 'эпоха популярности',
+                'verbose_name_plural': 'Эпохи популярности',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(db_index=True, default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата добавления'),
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
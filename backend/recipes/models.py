@@ -1,16 +1,19 @@
-import uuid
-
 from django.conf import settings
-from django.db import models
+from django.db import connections, models
+from django.db.models.functions import RowNumber
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
-from users.models import User
+from recipes import search, short_links
+from users.models import Subscription, User
 
 
 class Ingredient(models.Model):
     """Модель ингредиента."""
     name = models.TextField('Название', unique=True)
     measurement_unit = models.TextField('Единица измерения')
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True,
+                                      db_index=True)
 
     class Meta:
         verbose_name = 'ингредиент'
@@ -26,6 +29,8 @@ class Tag(models.Model):
     slug = models.SlugField('Слаг',
                             unique=True,
                             max_length=settings.MAX_LENGTH)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True,
+                                      db_index=True)
 
     class Meta:
         verbose_name = 'тэг'
@@ -54,6 +59,68 @@ class RecipeIngredient(models.Model):
         return f'{self.name}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов."""
+
+    def with_related(self):
+        """Подгружает автора, тэги и ингредиенты одним набором запросов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            models.Prefetch(
+                'ingredients',
+                queryset=RecipeIngredient.objects.select_related('name'),
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """Аннотирует флаги избранного, списка покупок и подписки."""
+        if not user.is_authenticated:
+            return self
+        return self.annotate(
+            favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            author_subscribed=models.Exists(Subscription.objects.filter(
+                user=user, subscribing=models.OuterRef('author'))),
+        )
+
+    def search(self, query):
+        """Полнотекстовый поиск с сортировкой по рангу."""
+        return search.filter_recipes(self, query)
+
+    def latest_by_author(self, author_ids, limit=None):
+        """Возвращает {автор: рецепты от новых к старым}.
+
+        С limit берёт не больше limit рецептов каждого автора одним
+        запросом с ROW_NUMBER() OVER (PARTITION BY author), а если база
+        не умеет оконные функции, отбрасывает лишние рецепты в Python.
+        """
+        # Порядок (-author, -id) совпадает с индексом recipe_author_id,
+        # и база обходит его без сортировки; порядок между авторами
+        # не важен, рецепты всё равно раскладываются по авторам.
+        queryset = self.filter(author__in=author_ids).order_by(
+            '-author', '-id')
+        features = connections[self.db].features
+        if limit is not None and features.supports_over_clause:
+            sql, params = queryset.annotate(position=models.Window(
+                RowNumber(),
+                partition_by=[models.F('author')],
+                order_by=models.F('id').desc(),
+            )).query.sql_with_params()
+            queryset = self.raw(
+                f'SELECT * FROM ({sql}) ranked WHERE ranked.position <= %s '
+                'ORDER BY ranked.author_id DESC, ranked.id DESC',
+                (*params, limit),
+            )
+        recipes = {author_id: [] for author_id in author_ids}
+        for recipe in queryset:
+            author_recipes = recipes[recipe.author_id]
+            if limit is None or len(author_recipes) < limit:
+                author_recipes.append(recipe)
+        return recipes
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
 
@@ -69,6 +136,12 @@ class Recipe(models.Model):
         default=None,
         verbose_name='Картинка',
     )
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки'
+    )
     text = models.TextField('Описание')
     ingredients = models.ManyToManyField(RecipeIngredient,
                                          verbose_name='Ингредиенты',
@@ -82,28 +155,47 @@ class Recipe(models.Model):
                                        verbose_name='Избранное')
     is_in_shopping_cart = models.BooleanField(default=False,
                                               verbose_name='Список покупок')
-    short_link = models.CharField(max_length=10, unique=True, blank=True)
+    short_link = models.CharField(max_length=10, unique=True, null=True,
+                                  blank=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в избранное'
+    )
+    popularity = models.FloatField(
+        default=0,
+        editable=False,
+        db_index=True,
+        verbose_name='Популярность'
+    )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True,
+                                      db_index=True)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         default_related_name = 'recipes'
         ordering = ('-id',)
+        indexes = [
+            models.Index(fields=['author', 'id'], name='recipe_author_id'),
+        ]
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return f'{self.name} {self.author}'
 
-    def save(self, *args, **kwargs):
-        if not self.short_link:
-            self.short_link = str(
-                uuid.uuid4())[:settings.SHORT_LINK_MAX_LENGTH]
-        super().save(*args, **kwargs)
+    def get_short_link(self):
+        """Код короткой ссылки: сохранённый старый или вычисленный по id."""
+        return self.short_link or short_links.encode(self.id)
 
 
 class Favorite(models.Model):
     """Модель избранного."""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    created_at = models.DateTimeField('Дата добавления',
+                                      default=timezone.now, editable=False)
 
     class Meta:
         default_related_name = 'favorites'
@@ -121,6 +213,8 @@ class ShoppingCart(models.Model):
     """Модель списка покупок."""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    created_at = models.DateTimeField('Дата добавления',
+                                      default=timezone.now, editable=False)
 
     class Meta:
         default_related_name = 'shoppingcart'
@@ -132,3 +226,140 @@ class ShoppingCart(models.Model):
         ]
         verbose_name = 'список покупок'
         verbose_name_plural = 'Список покупок'
+
+
+class ShoppingCartIngredientQuerySet(models.QuerySet):
+    """Набор запросов сумм ингредиентов в списках покупок."""
+
+    def apply_deltas(self, user_ids, deltas):
+        """Прибавляет deltas {(ингредиент, единица): количество} к спискам
+        покупок пользователей user_ids."""
+        deltas = {key: amount for key, amount in deltas.items() if amount}
+        if not deltas:
+            return
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        added = [key for key, amount in deltas.items() if amount > 0]
+        if added:
+            self.bulk_create(
+                [ShoppingCartIngredient(user_id=user_id,
+                                        ingredient_id=ingredient,
+                                        measurement_unit=unit,
+                                        total_amount=0)
+                 for user_id in user_ids for ingredient, unit in added],
+                ignore_conflicts=True,
+            )
+        ingredient_ids = {ingredient for ingredient, _ in deltas}
+        rows = self.filter(user_id__in=user_ids,
+                           ingredient_id__in=ingredient_ids)
+        rows.update(total_amount=models.F('total_amount') + models.Case(
+            *(models.When(ingredient_id=ingredient, measurement_unit=unit,
+                          then=models.Value(amount))
+              for (ingredient, unit), amount in deltas.items()),
+            default=models.Value(0),
+            output_field=models.IntegerField(),
+        ))
+        if len(added) < len(deltas):
+            rows.filter(total_amount__lte=0).delete()
+
+    def add_recipe(self, user_ids, recipe_id, sign=1):
+        """Добавляет (или вычитает при sign=-1) ингредиенты рецепта."""
+        deltas = {
+            (ingredient, unit): sign * amount
+            for ingredient, unit, amount in RecipeIngredient.objects
+            .filter(recipes=recipe_id)
+            .values_list('name_id', 'measurement_unit')
+            .annotate(amount=models.Sum('amount'))
+        }
+        self.apply_deltas(user_ids, deltas)
+
+    def expected_totals(self, user_ids):
+        """Считает суммы по спискам покупок заново."""
+        return {
+            (user_id, ingredient, unit): amount
+            for user_id, ingredient, unit, amount in RecipeIngredient.objects
+            .filter(recipes__shoppingcart__user__in=user_ids)
+            .values_list('recipes__shoppingcart__user', 'name_id',
+                         'measurement_unit')
+            .annotate(amount=models.Sum('amount'))
+            .order_by()
+        }
+
+
+class ShoppingCartIngredient(models.Model):
+    """Модель суммы ингредиента в списке покупок пользователя."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    ingredient = models.ForeignKey(Ingredient,
+                                   on_delete=models.CASCADE,
+                                   verbose_name='Ингредиент')
+    measurement_unit = models.TextField('Единица измерения')
+    total_amount = models.IntegerField('Количество', default=0)
+
+    objects = ShoppingCartIngredientQuerySet.as_manager()
+
+    class Meta:
+        default_related_name = 'shopping_cart_ingredients'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient', 'measurement_unit'],
+                name='unique_sc_ingredient'
+            )
+        ]
+        verbose_name = 'ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+
+
+class FeedEntry(models.Model):
+    """Модель записи в ленте подписок пользователя."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='feed_entries')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='feed_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='feed_entry_user_author'),
+        ]
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'Лента подписок'
+
+
+class PopularityEpoch(models.Model):
+    """Модель начала эпохи очков популярности.
+
+    Очки рецептов хранятся умноженными на 2 ** ((t - started) / период
+    полураспада), поэтому старые добавления весят меньше без пересчёта
+    при каждом чтении. Строка одна, её сдвигает decay_popularity.
+    """
+    started = models.FloatField('Начало эпохи, Unix-время')
+
+    class Meta:
+        verbose_name = 'эпоха популярности'
+        verbose_name_plural = 'Эпохи популярности'
+
+
+class RecipeSearchDocument(models.Model):
+    """Документ рецепта в таблице FTS5 для поиска в SQLite.
+
+    Таблицу создаёт и наполняет миграция 0008_search_index, а модель
+    нужна только для соединения с ней в запросах, поэтому не управляется
+    Django. В PostgreSQL таблицы нет и модель не используется.
+    """
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', related_name='search_document')
+    document = search.MatchField(db_column=search.FTS_TABLE)
+
+    class Meta:
+        managed = False
+        db_table = search.FTS_TABLE
@@ -0,0 +1,153 @@
+"""Популярность рецептов с затуханием по времени.
+
+Каждое добавление в избранное или список покупок прибавляет к
+Recipe.popularity свой вес, умноженный на 2 ** ((t - started) /
+POPULARITY_HALF_LIFE), где started — начало эпохи из PopularityEpoch.
+Так свежие добавления весят больше старых, а очки не нужно пересчитывать
+при каждом чтении. Удаление вычитает ровно то, что прибавило
+добавление. Команда decay_popularity приводит очки к новому началу
+эпохи, чтобы множители не росли, и сбрасывает закэшированные топы.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Greatest
+
+from api.cache import bump, get_versions
+from recipes.models import (Favorite, PopularityEpoch, Recipe, ShoppingCart,
+                            Tag)
+
+EPOCH_ID = 1
+TOP_KEY = 'popular:{}:{}'
+ALL_TAGS = '*'
+
+
+def weight(model):
+    return {
+        Favorite: settings.POPULARITY_FAVORITE_WEIGHT,
+        ShoppingCart: settings.POPULARITY_CART_WEIGHT,
+    }[model]
+
+
+def _locked_epoch_start():
+    """Начало эпохи, заблокированное до конца транзакции от rebase().
+
+    В Django 3.2 нет select_for_share(), поэтому запрос написан вручную.
+    """
+    table = connection.ops.quote_name(PopularityEpoch._meta.db_table)
+    lock = ' FOR SHARE' if connection.features.has_select_for_update else ''
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT started FROM {table} WHERE id = %s{lock}',
+                       [EPOCH_ID])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def change(recipe_id, amount, moment):
+    """Прибавляет к очкам рецепта amount, набранный в момент moment.
+
+    Строка эпохи блокируется на чтение до конца транзакции: rebase()
+    ждёт, пока прибавка не будет записана, а прибавка, начатая во время
+    rebase(), увидит уже новое начало эпохи и пересчитанные очки.
+    """
+    moment = moment.timestamp()
+    with transaction.atomic(savepoint=False):
+        started = _locked_epoch_start()
+        if started is None:
+            # Без строки эпохи (например, после flush) эпоха начинается
+            # сейчас.
+            started = moment
+        factor = math.pow(2, (moment - started)
+                          / settings.POPULARITY_HALF_LIFE)
+        Recipe.objects.filter(pk=recipe_id).update(popularity=Greatest(
+            F('popularity') + Value(amount * factor), Value(0.0),
+            output_field=FloatField()))
+
+
+def rebase(now=None):
+    """Сдвигает начало эпохи на now и умножает очки на тот же множитель.
+
+    Порядок рецептов от этого не меняется: все очки делятся на одно и
+    то же число.
+    """
+    now = time.time() if now is None else now
+    with transaction.atomic():
+        epoch, _ = PopularityEpoch.objects.select_for_update().get_or_create(
+            pk=EPOCH_ID, defaults={'started': now})
+        factor = math.pow(2, (epoch.started - now)
+                          / settings.POPULARITY_HALF_LIFE)
+        updated = Recipe.objects.filter(popularity__gt=0).update(
+            popularity=F('popularity') * Value(factor))
+        epoch.started = now
+        epoch.save(update_fields=['started'])
+    return updated
+
+
+def recompute(now=None):
+    """Пересчитывает очки всех рецептов из избранного и списков покупок."""
+    now = time.time() if now is None else now
+    half_life = settings.POPULARITY_HALF_LIFE
+    scores = {}
+    for model in (Favorite, ShoppingCart):
+        amount = weight(model)
+        for recipe_id, created_at in model.objects.values_list(
+                'recipe_id', 'created_at').iterator():
+            scores[recipe_id] = scores.get(recipe_id, 0) + amount * math.pow(
+                2, (created_at.timestamp() - now) / half_life)
+    with transaction.atomic():
+        PopularityEpoch.objects.update_or_create(
+            pk=EPOCH_ID, defaults={'started': now})
+        Recipe.objects.update(popularity=0)
+        Recipe.objects.bulk_update(
+            [Recipe(pk=pk, popularity=score)
+             for pk, score in scores.items()],
+            ['popularity'], batch_size=1000)
+    return len(scores)
+
+
+def compute_top(tag_slug=None):
+    queryset = Recipe.objects.filter(popularity__gt=0)
+    if tag_slug is not None:
+        queryset = queryset.filter(tags__slug=tag_slug)
+    return list(queryset.order_by('-popularity', '-id').values_list(
+        'id', flat=True)[:settings.POPULARITY_TOP_SIZE])
+
+
+def top_key(tag_slug):
+    # Тэг приходит из запроса, поэтому в ключ попадает его хэш: так ключ
+    # всегда допустим для memcached и не длиннее 250 символов.
+    digest = hashlib.md5((tag_slug or ALL_TAGS).encode()).hexdigest()
+    version, = get_versions(['popular'])
+    return TOP_KEY.format(digest, version)
+
+
+def top(tag_slug=None):
+    """Id самых популярных рецептов тэга из кэша.
+
+    Список живёт POPULARITY_CACHE_TIMEOUT секунд, так что свежие
+    добавления попадают в него с этой задержкой. Пустой топ
+    несуществующего тэга не кэшируется, чтобы произвольные значения
+    tag не заполняли кэш.
+    """
+    key = top_key(tag_slug)
+    ids = cache.get(key)
+    if ids is None:
+        ids = compute_top(tag_slug)
+        if ids or tag_slug is None or Tag.objects.filter(
+                slug=tag_slug).exists():
+            cache.set(key, ids, settings.POPULARITY_CACHE_TIMEOUT)
+    return ids
+
+
+def reset_top():
+    """Сбрасывает закэшированные топы во всех процессах.
+
+    Версия популярности хранится в общем кэше, поэтому после сдвига
+    эпохи каждый процесс соберёт топы заново при первом чтении.
+    """
+    bump('popular')
@@ -0,0 +1,144 @@
+"""Уменьшенные копии картинок рецептов и аватаров.
+
+Для каждой ширины из IMAGE_RENDITION_WIDTHS, меньшей ширины оригинала,
+рядом с оригиналом сохраняется копия в исходном формате и, если Pillow
+собран с её поддержкой, в WebP. Список копий хранится в JSON-поле
+модели вместе с именем оригинала, по которому видно, что картинка
+сменилась и копии пора пересобрать.
+"""
+import logging
+import os
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from api.cache import bump
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+EXTENSIONS = {'jpeg': 'jpg'}
+LANCZOS = getattr(Image, 'Resampling', Image).LANCZOS
+# Аватар в закэшированных ответах встречается только в карточках рецептов.
+CACHE_NAMESPACES = {'recipes': 'recipes', 'users': 'authors'}
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 80, 'method': 4},
+}
+
+
+def is_stale(field_file, renditions):
+    """Проверяет, соответствуют ли копии текущей картинке."""
+    return (renditions or {}).get('source') != (field_file.name or None)
+
+
+def delete(renditions):
+    """Удаляет файлы копий."""
+    for item in (renditions or {}).get('items', []):
+        default_storage.delete(item['name'])
+
+
+def _encode(image, image_format):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, **SAVE_OPTIONS[image_format])
+    return buffer.getvalue()
+
+
+def build(field_file):
+    """Сохраняет копии картинки и возвращает их описание."""
+    if not field_file:
+        return {}
+    try:
+        with field_file.open('rb') as f:
+            image = Image.open(f)
+            source_format = image.format
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, UnidentifiedImageError, ValueError) as e:
+        logger.warning('Не удалось открыть %s: %s', field_file.name, e)
+        return {'source': field_file.name, 'items': []}
+    formats = [source_format if source_format in FORMATS else 'JPEG']
+    if 'WEBP' not in formats and features.check('webp'):
+        formats.append('WEBP')
+    directory, filename = os.path.split(field_file.name)
+    stem = os.path.splitext(filename)[0]
+    items = []
+    for width in sorted(settings.IMAGE_RENDITION_WIDTHS):
+        if width >= image.width:
+            break
+        height = max(round(image.height * width / image.width), 1)
+        resized = image.resize((width, height), LANCZOS)
+        for image_format in formats:
+            name = default_storage.save(
+                os.path.join(directory, 'renditions',
+                             f'{stem}_{width}.{FORMATS[image_format]}'),
+                ContentFile(_encode(resized, image_format)),
+            )
+            items.append({'name': name, 'width': width,
+                          'format': FORMATS[image_format]})
+    return {'source': field_file.name, 'width': image.width,
+            'height': image.height, 'items': items}
+
+
+def rebuild(instance, field_name, renditions_name):
+    """Пересобирает копии картинки и сохраняет их, если она не сменилась.
+
+    update() не шлёт post_save, поэтому дата изменения и версии кэша
+    из CACHE_NAMESPACES обновляются здесь же, иначе закэшированные
+    ответы и ETag остались бы с пустым srcset.
+    """
+    field_file = getattr(instance, field_name)
+    old = getattr(instance, renditions_name)
+    new = build(field_file)
+    if field_file:
+        unchanged = Q(**{field_name: field_file.name})
+    else:
+        unchanged = (Q(**{field_name: ''})
+                     | Q(**{f'{field_name}__isnull': True}))
+    model = type(instance)
+    fields = {renditions_name: new}
+    try:
+        model._meta.get_field('updated_at')
+    except FieldDoesNotExist:
+        pass
+    else:
+        fields['updated_at'] = timezone.now()
+    updated = model.objects.filter(unchanged, pk=instance.pk).update(**fields)
+    if not updated:
+        delete(new)
+        return
+    transaction.on_commit(
+        partial(bump, CACHE_NAMESPACES[model._meta.app_label]))
+    setattr(instance, renditions_name, new)
+    delete(old)
+
+
+def srcset(field_file, renditions, request=None):
+    """Строит {формат: srcset} из копий и оригинала."""
+    if not field_file or is_stale(field_file, renditions):
+        return {}
+    sets = {}
+    for item in renditions.get('items', []):
+        sets.setdefault(item['format'], []).append(
+            (default_storage.url(item['name']), item['width']))
+    extension = os.path.splitext(field_file.name)[1].lstrip('.').lower()
+    if 'width' in renditions:
+        sets.setdefault(EXTENSIONS.get(extension, extension), []).append(
+            (field_file.url, renditions['width']))
+    return {
+        image_format: ', '.join(
+            f'{request.build_absolute_uri(url) if request else url} {width}w'
+            for url, width in candidates)
+        for image_format, candidates in sets.items()
+    }
@@ -0,0 +1,137 @@
+"""Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+
+Индекс живёт вне модели и зависит от базы: в PostgreSQL это колонка
+recipes_recipe.search_vector типа tsvector с GIN-индексом, в SQLite —
+виртуальная таблица FTS5 recipes_recipe_fts с rowid, равным id рецепта.
+Оба создаёт миграция 0008_search_index. Совпадения в названии весят
+больше, чем в описании, а те — больше, чем в ингредиентах.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Lookup, Q, TextField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'recipes_recipe_fts'
+# Веса столбцов name, text и ingredients для bm25 в SQLite.
+FTS_WEIGHTS = '10.0, 4.0, 1.0'
+WORD = re.compile(r'\w+')
+
+INGREDIENT_NAMES = {
+    'postgresql': 'string_agg',
+    'sqlite': 'group_concat',
+}
+
+
+class MatchField(TextField):
+    """Скрытый столбец FTS5 с именем таблицы, по которому ищет MATCH."""
+
+
+@MatchField.register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+def ingredient_names_sql(vendor):
+    """Подзапрос, склеивающий названия ингредиентов рецепта."""
+    return (
+        f"coalesce((SELECT {INGREDIENT_NAMES[vendor]}(i.name, ' ') "
+        'FROM recipes_recipe_ingredients ri '
+        'JOIN recipes_recipeingredient r ON r.id = ri.recipeingredient_id '
+        'JOIN recipes_ingredient i ON i.id = r.name_id '
+        "WHERE ri.recipe_id = recipes_recipe.id), '')"
+    )
+
+
+def is_supported():
+    return connection.vendor in INGREDIENT_NAMES
+
+
+def index_recipes(recipe_ids):
+    """Пересобирает документы поиска рецептов recipe_ids."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or not is_supported():
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    ingredients = ingredient_names_sql(connection.vendor)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            config = settings.SEARCH_CONFIG
+            cursor.execute(
+                'UPDATE recipes_recipe SET search_vector = '
+                "setweight(to_tsvector(%s::regconfig, name), 'A') || "
+                "setweight(to_tsvector(%s::regconfig, text), 'B') || "
+                f"setweight(to_tsvector(%s::regconfig, {ingredients}), 'C') "
+                f'WHERE id IN ({placeholders})',
+                [config, config, config, *recipe_ids],
+            )
+            return
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids)
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+            f'SELECT id, name, text, {ingredients} FROM recipes_recipe '
+            f'WHERE id IN ({placeholders})',
+            recipe_ids,
+        )
+
+
+def remove_recipes(recipe_ids):
+    """Убирает удалённые рецепты из таблицы FTS5."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or connection.vendor != 'sqlite':
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids)
+
+
+def fts_query(words):
+    # Каждое слово в кавычках ищется как префикс, что частично заменяет
+    # стемминг, которого нет у токенизатора unicode61.
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def filter_recipes(queryset, query):
+    """Оставляет рецепты, подходящие под query, от лучших к худшим.
+
+    Ранг кладётся в аннотацию search_rank. На базах без индекса поиск
+    сводится к icontains по названию и описанию без ранжирования.
+    """
+    words = WORD.findall(query.lower())
+    if not words:
+        return queryset
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        # Соединение с таблицей FTS5 считает bm25 за один проход по
+        # совпадениям; коррелированный подзапрос делал бы MATCH на
+        # каждую строку.
+        return queryset.filter(
+            search_document__document__match=fts_query(words),
+        ).annotate(search_rank=RawSQL(
+            f'-bm25({FTS_TABLE}, {FTS_WEIGHTS})', [],
+            output_field=FloatField(),
+        )).order_by('-search_rank', '-id')
+    if vendor != 'postgresql':
+        condition = Q()
+        for word in words:
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+        return queryset.filter(condition)
+    params = [settings.SEARCH_CONFIG, ' '.join(words)]
+    tsquery = 'plainto_tsquery(%s::regconfig, %s)'
+    return queryset.alias(search_match=RawSQL(
+        f'recipes_recipe.search_vector @@ {tsquery}', params,
+        output_field=BooleanField(),
+    )).filter(search_match=True).annotate(search_rank=RawSQL(
+        f'ts_rank_cd(recipes_recipe.search_vector, {tsquery})', params,
+        output_field=FloatField(),
+    )).order_by('-search_rank', '-id')
@@ -0,0 +1,75 @@
+"""Короткие ссылки на рецепты.
+
+Код — это id рецепта, пропущенный через ключевую перестановку
+x -> (a * x + b) mod 62^6 и записанный в base62 ровно шестью символами.
+Перестановка взаимно однозначна, поэтому коды не сталкиваются и не
+требуют ни проверки уникальности, ни хранения в базе. Рецепты,
+созданные до перехода, сохраняют свои четырёхсимвольные коды в поле
+Recipe.short_link.
+"""
+import hashlib
+import string
+from functools import lru_cache
+
+from django.conf import settings
+
+ALPHABET = string.digits + string.ascii_letters
+BASE = len(ALPHABET)
+SPACE = BASE ** settings.SHORT_LINK_LENGTH
+
+
+@lru_cache(maxsize=None)
+def _key():
+    digest = hashlib.sha256(settings.SHORT_LINK_SALT.encode()).digest()
+    multiplier = int.from_bytes(digest[:8], 'big') % SPACE
+    # Множитель должен быть взаимно прост с 62^6 = 2^6 * 31^6.
+    while multiplier % 2 == 0 or multiplier % 31 == 0:
+        multiplier += 1
+    offset = int.from_bytes(digest[8:16], 'big') % SPACE
+    return multiplier, pow(multiplier, -1, SPACE), offset
+
+
+def encode(recipe_id):
+    """Возвращает короткий код рецепта."""
+    if not 0 < recipe_id < SPACE:
+        raise ValueError(f'id {recipe_id} не помещается в короткую ссылку')
+    multiplier, _, offset = _key()
+    value = (recipe_id * multiplier + offset) % SPACE
+    chars = []
+    for _ in range(settings.SHORT_LINK_LENGTH):
+        value, digit = divmod(value, BASE)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def decode(code):
+    """Возвращает id рецепта по коду или None, если код не наш."""
+    if len(code) != settings.SHORT_LINK_LENGTH:
+        return None
+    value = 0
+    for char in code:
+        digit = ALPHABET.find(char)
+        if digit < 0:
+            return None
+        value = value * BASE + digit
+    _, inverse, offset = _key()
+    recipe_id = (value - offset) * inverse % SPACE
+    return recipe_id or None
+
+
+@lru_cache(maxsize=settings.SHORT_LINK_CACHE_SIZE)
+def resolve(code):
+    """Возвращает id рецепта по коду; найденные ответы кэшируются.
+
+    Для неизвестного кода бросает Recipe.DoesNotExist: исключения
+    lru_cache не запоминает, и рецепт, созданный позже, найдётся.
+    """
+    from recipes.models import Recipe
+
+    recipe_id = decode(code)
+    if recipe_id is None:
+        return Recipe.objects.values_list('id', flat=True).get(
+            short_link=code)
+    if not Recipe.objects.filter(id=recipe_id).exists():
+        raise Recipe.DoesNotExist
+    return recipe_id
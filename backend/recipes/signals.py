@@ -0,0 +1,168 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from jobs.queue import enqueue
+from recipes import feed, popularity, renditions, search, short_links
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    ShoppingCartIngredient,
+)
+from users.models import Subscription, User
+
+
+def change_counter(model, pk, field, delta):
+    """Сдвигает счётчик одним UPDATE, не опуская его ниже нуля."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_cart_totals(instance, created, **kwargs):
+    if created:
+        ShoppingCartIngredient.objects.add_recipe(
+            [instance.user_id], instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_cart_totals(instance, **kwargs):
+    ShoppingCartIngredient.objects.add_recipe(
+        [instance.user_id], instance.recipe_id, sign=-1)
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+def add_popularity(sender, instance, created, **kwargs):
+    if created:
+        popularity.change(instance.recipe_id, popularity.weight(sender),
+                          instance.created_at)
+
+
+def remove_popularity(sender, instance, **kwargs):
+    popularity.change(instance.recipe_id, -popularity.weight(sender),
+                      instance.created_at)
+
+
+for model in (Favorite, ShoppingCart):
+    post_save.connect(add_popularity, sender=model)
+    post_delete.connect(remove_popularity, sender=model)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Subscription)
+def increment_subscribers_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.subscribing_id, 'subscribers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_subscribers_count(instance, **kwargs):
+    change_counter(User, instance.subscribing_id, 'subscribers_count', -1)
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_short_links(**kwargs):
+    short_links.resolve.cache_clear()
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe_renditions(instance, **kwargs):
+    if renditions.is_stale(instance.image, instance.image_renditions):
+        enqueue('build_renditions', model='recipes.Recipe', pk=instance.pk,
+                field_name='image', renditions_name='image_renditions')
+
+
+@receiver(post_save, sender=User)
+def refresh_avatar_renditions(instance, **kwargs):
+    if renditions.is_stale(instance.avatar, instance.avatar_renditions):
+        enqueue('build_renditions', model='users.User', pk=instance.pk,
+                field_name='avatar', renditions_name='avatar_renditions')
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_renditions(instance, **kwargs):
+    if instance.image_renditions.get('items'):
+        enqueue('delete_renditions',
+                renditions_data=instance.image_renditions)
+
+
+@receiver(post_delete, sender=User)
+def delete_avatar_renditions(instance, **kwargs):
+    if instance.avatar_renditions.get('items'):
+        enqueue('delete_renditions',
+                renditions_data=instance.avatar_renditions)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(instance, **kwargs):
+    # Ингредиенты и тэги сохраняются после рецепта, поэтому документ
+    # собирается уже после фиксации транзакции.
+    transaction.on_commit(partial(search.index_recipes, [instance.pk]))
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(instance, **kwargs):
+    search.remove_recipes([instance.pk])
+
+
+def index_ingredient_recipes(ingredient_id):
+    search.index_recipes(Recipe.objects.filter(
+        ingredients__name=ingredient_id).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(
+            partial(index_ingredient_recipes, instance.pk))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        enqueue('fan_out_recipe', recipe_id=instance.pk)
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_feed(instance, created, **kwargs):
+    if created:
+        feed.backfill([instance.user_id], instance.subscribing_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def forget_feed(instance, **kwargs):
+    feed.forget(instance.user_id, instance.subscribing_id)
+    # Автор, у которого подписчиков стало ровно FEED_FANOUT_LIMIT, снова
+    # раскладывается по лентам, и рецепты, вышедшие без раскладки, нужно
+    # донести до его подписчиков.
+    if User.objects.filter(pk=instance.subscribing_id,
+                           subscribers_count=settings.FEED_FANOUT_LIMIT
+                           ).exists():
+        enqueue('backfill_author_feed', author_id=instance.subscribing_id)
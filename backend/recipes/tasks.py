@@ -0,0 +1,28 @@
+from django.apps import apps
+
+from jobs.queue import task
+from recipes import feed, renditions
+
+
+@task('build_renditions', timeout=120)
+def build_renditions(model, pk, field_name, renditions_name):
+    instance = apps.get_model(model).objects.filter(pk=pk).first()
+    if instance is not None and renditions.is_stale(
+            getattr(instance, field_name),
+            getattr(instance, renditions_name)):
+        renditions.rebuild(instance, field_name, renditions_name)
+
+
+@task('delete_renditions')
+def delete_renditions(renditions_data):
+    renditions.delete(renditions_data)
+
+
+@task('fan_out_recipe')
+def fan_out_recipe(recipe_id):
+    feed.fan_out(recipe_id)
+
+
+@task('backfill_author_feed')
+def backfill_author_feed(author_id):
+    feed.backfill_subscribers(author_id)
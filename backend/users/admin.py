@@ -4,6 +4,7 @@ from .models import Subscription, User
 
 
 class UserAdmin(admin.ModelAdmin):
+    list_display = ('username', 'email', 'recipes_count', 'subscribers_count')
     search_fields = ('username', 'email')
 
 
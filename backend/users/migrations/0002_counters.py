@@ -0,0 +1,37 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:39
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_subscribers_count(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Subscription = apps.get_model('users', 'Subscription')
+    User.objects.update(subscribers_count=Coalesce(models.Subquery(
+        Subscription.objects.filter(subscribing=models.OuterRef('pk'))
+        .values('subscribing')
+        .annotate(total=models.Count('id'))
+        .values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число рецептов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число подписчиков'),
+        ),
+        migrations.RunPython(fill_subscribers_count,
+                             migrations.RunPython.noop),
+    ]
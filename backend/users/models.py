@@ -25,7 +25,23 @@ class User(AbstractUser):
         default=None,
         verbose_name='Аватар'
     )
+    avatar_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии аватара'
+    )
     is_subscribed = models.BooleanField(default=False, verbose_name='Подписка')
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число рецептов'
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число подписчиков'
+    )
 
     class Meta:
         verbose_name = 'пользователь'